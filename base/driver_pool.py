@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from selenium.common.exceptions import WebDriverException
+from base.webdriver_base import setup_driver
+
+logger = logging.getLogger(__name__)
+
+
+class DriverPool:
+    def __init__(self, size=4, max_pages=50, headless=True, fast=False, driver_factory=None):
+        self.size = size
+        self.max_pages = max_pages  # recycle a browser after this many pages
+        self.headless = headless
+        self.fast = fast
+        self.driver_factory = driver_factory or setup_driver
+        # Capacity is tracked under one condition, so a discarded browser wakes a waiting caller
+        # just like a returned one does
+        self._cond = threading.Condition()
+        self._idle = []
+        self._page_counts = {}
+        self._created = 0
+        self._closed = False
+
+    def _new_driver(self):
+        # The caller has already reserved the slot; give it back if Chrome fails to start
+        try:
+            driver = self.driver_factory(headless=self.headless, fast=self.fast)
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._page_counts[id(driver)] = 0
+        return driver
+
+    def _quit(self, driver):
+        with self._cond:
+            self._page_counts.pop(id(driver), None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def _discard(self, driver):
+        self._quit(driver)
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    driver = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    driver = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No browser became free within {timeout}s")
+                self._cond.wait(remaining)
+
+        if driver is None:
+            return self._new_driver()
+        if not self.is_healthy(driver):
+            logger.warning("Replacing unresponsive browser session")
+            # The new browser takes over the old one's slot, so no waiter can claim it in between
+            self._quit(driver)
+            return self._new_driver()
+        return driver
+
+    def release(self, driver, failed=False):
+        with self._cond:
+            pages = self._page_counts.get(id(driver), 0) + 1
+            self._page_counts[id(driver)] = pages
+            keep = not (self._closed or failed or pages >= self.max_pages)
+            if keep:
+                self._idle.append(driver)
+                self._cond.notify()
+        if not keep:
+            self._discard(driver)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        driver = self.acquire(timeout)
+        failed = False
+        try:
+            yield driver
+        except WebDriverException:
+            failed = True
+            raise
+        finally:
+            self.release(driver, failed=failed)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            # Callers still waiting for a browser get the "closed" error instead of waiting forever
+            self._cond.notify_all()
+        for driver in idle:
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
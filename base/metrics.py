@@ -0,0 +1,280 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_text(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        with self._lock:
+            return [
+                f"{self.name}{_label_text(self.label_names, key)} {value}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._callbacks = {}  # fixed labels -> callback
+        self._lock = threading.Lock()
+
+    def set_callback(self, callback, labels=None):
+        # callback() returns either a number or a {label_value: number} dict for the 'name' label;
+        # gauges read live state, so a newer callback for the same labels replaces an older one
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            self._callbacks[key] = callback
+
+    def remove(self, callback, labels=None):
+        # Only drops the series while it still reads from this callback, not from a replacement
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            if self._callbacks.get(key) == callback:
+                del self._callbacks[key]
+
+    def render(self):
+        lines = []
+        with self._lock:
+            callbacks = sorted(self._callbacks.items(), key=lambda item: item[0])
+        for key, callback in callbacks:
+            label_names = tuple(name for name, _ in key)
+            label_values = tuple(value for _, value in key)
+            value = callback()
+            if isinstance(value, dict):
+                lines.extend(
+                    f"{self.name}{_label_text(label_names, label_values, ('name', name))} {item}"
+                    for name, item in sorted(value.items())
+                )
+            else:
+                lines.append(f"{self.name}{_label_text(label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            # The block may fill in labels (e.g. an outcome) on the yielded dict
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        series = self._series.get(key)
+        return series[-2] if series else 0
+
+    def label_values(self, label):
+        index = self.label_names.index(label)
+        with self._lock:
+            return sorted({key[index] for key in self._series})
+
+    def merged(self, **labels):
+        # Sums every series whose labels match the given ones, e.g. all statuses of one endpoint
+        wanted = {self.label_names.index(name): str(value) for name, value in labels.items()}
+        total = [0] * (len(self.buckets) + 2)
+        with self._lock:
+            for key, series in self._series.items():
+                if all(key[index] == value for index, value in wanted.items()):
+                    total = [a + b for a, b in zip(total, series)]
+        return total
+
+    def quantile(self, q, **labels):
+        # Linear interpolation inside the bucket, as Prometheus' histogram_quantile does
+        series = self.merged(**labels)
+        count = series[-2]
+        if not count:
+            return None
+        rank = q * count
+        lower_bound, lower_count = 0.0, 0
+        for bound, cumulative in zip(self.buckets, series):
+            if cumulative >= rank:
+                if cumulative == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+            lower_bound, lower_count = bound, cumulative
+        return self.buckets[-1]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for index, bound in enumerate(self.buckets):
+                    lines.append(
+                        f"{self.name}_bucket{_label_text(self.label_names, key, ('le', bound))} {series[index]}"
+                    )
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, ('le', '+Inf'))} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, callback, labels=None):
+        # labels tell apart several owners of one gauge, e.g. one pipeline per org
+        gauge = self._register(Gauge(name, help_text))
+        gauge.set_callback(callback, labels)
+        return gauge
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if hasattr(metric, 'reset'):
+                metric.reset()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} failed to render: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+# Shared instruments, registered once so every module reports into the same series
+API_REQUEST_SECONDS = METRICS.histogram(
+    'zoho_api_request_seconds', 'Zoho API call latency', ('endpoint', 'status'))
+API_RETRIES = METRICS.counter('zoho_api_retries_total', 'Zoho API calls retried', ('reason',))
+RATE_LIMITED = METRICS.counter('zoho_api_rate_limited_total', 'Zoho API calls answered with 429', ('endpoint',))
+TOKEN_REFRESHES = METRICS.counter('zoho_token_refreshes_total', 'OAuth access token refreshes', ('outcome',))
+SCRAPE_SECONDS = METRICS.histogram('scrape_seconds', 'Whole address lookups', ('mode', 'outcome'))
+EXTRACT_SECONDS = METRICS.histogram(
+    'scrape_extract_seconds', 'Knowledge panel field extraction', ('field',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+WAIT_SECONDS = METRICS.histogram('webdriver_wait_seconds', 'Condition waits in the browser', ('step', 'outcome'))
+CACHE_LOOKUPS = METRICS.counter('scrape_cache_lookups_total', 'Scrape cache lookups', ('result',))
+IMAGE_DOWNLOAD_SECONDS = METRICS.histogram('image_download_seconds', 'Image fetches', ('outcome',))
+IMAGE_BYTES = METRICS.counter('image_download_bytes_total', 'Image bytes downloaded', ('source',))
+IMAGE_UPLOAD_SECONDS = METRICS.histogram('image_upload_seconds', 'Image sync to the CRM per record', ('method',))
+STAGE_SECONDS = METRICS.histogram('pipeline_stage_seconds', 'Pipeline stage handler time', ('stage', 'outcome'))
+
+
+class MetricsServer:
+    def __init__(self, port=9108, host='0.0.0.0', registry=METRICS):
+        registry_ref = registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry_ref.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,45 @@
+import cProfile
+import io
+import logging
+import pstats
+
+logger = logging.getLogger(__name__)
+
+
+def profile_call(fn, *args, output_path=None, engine='cprofile', limit=40, **kwargs):
+    # Profiles a single call (e.g. one sync cycle) and writes the report; returns fn's result.
+    # Only the calling thread is sampled, so profile the cycle on its own thread.
+    if engine == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument is not installed; falling back to cProfile")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+                report = profiler.output_text(unicode=True, color=False)
+                _write_report(report, output_path or 'profile.txt')
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        if output_path and output_path.endswith(('.prof', '.pstats')):
+            profiler.dump_stats(output_path)
+            logger.info("Wrote profile to %s", output_path)
+        else:
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(limit)
+            _write_report(buffer.getvalue(), output_path or 'profile.txt')
+
+
+def _write_report(report, path):
+    with open(path, 'w') as report_file:
+        report_file.write(report)
+    logger.info("Wrote profile to %s", path)
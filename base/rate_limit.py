@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        # rate: tokens added per second; capacity: the largest burst allowed after an idle spell
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, count, burst=None, **kwargs):
+        return cls(count / 60.0, burst, **kwargs)
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill(self.clock())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def delay(self, tokens=1):
+        # Seconds until `tokens` would be available, without taking them
+        with self._lock:
+            self._refill(self.clock())
+            return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def acquire(self, tokens=1, timeout=None):
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            self.waited += wait
+            self.sleep(wait)
+
+
+class DomainRateLimiter:
+    # A TokenBucket per target host, plus a cool-down that holds back every request to a host that
+    # has started blocking us. per_minute=None leaves hosts without an entry in rates unthrottled.
+    def __init__(self, per_minute=None, burst=None, rates=None, clock=time.monotonic, sleep=time.sleep):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.rates = rates or {}
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        return (urlsplit(url).hostname or url).casefold()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                per_minute = self.rates.get(host, self.per_minute)
+                self._buckets[host] = TokenBucket.per_minute(
+                    per_minute, self.burst, clock=self.clock, sleep=self.sleep
+                ) if per_minute else None
+            return self._buckets[host]
+
+    def pause(self, url, seconds):
+        host = self.host(url)
+        with self._lock:
+            self._paused_until[host] = max(self._paused_until.get(host, 0), self.clock() + seconds)
+        logger.warning(f"Pausing requests to {host} for {seconds:.0f}s", extra={"host": host})
+
+    def paused_for(self, url):
+        with self._lock:
+            return max(0.0, self._paused_until.get(self.host(url), 0) - self.clock())
+
+    def acquire(self, url, timeout=None):
+        # Waits out any pause on the host, then for a token; False if that takes longer than timeout
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            wait = self.paused_for(url)
+            if not wait:
+                break
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            self.sleep(wait)
+        bucket = self.bucket(self.host(url))
+        if bucket is None:
+            return True
+        return bucket.acquire(timeout=None if deadline is None else max(0.0, deadline - self.clock()))
@@ -1,19 +1,84 @@
 # import undetected_chromedriver as uc
+import logging
+import time
+from collections import defaultdict, deque
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
+from base.metrics import WAIT_SECONDS
 
-def setup_driver():
+logger = logging.getLogger(__name__)
+
+# Resources the fast scraping mode never downloads; the DOM keeps their URLs
+FAST_MODE_BLOCKED_URLS = [
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*fonts.googleapis.com*", "*fonts.gstatic.com*",
+]
+
+# Counts in-flight fetch/XHR calls so network idle can be detected from the page
+NETWORK_HOOK_JS = """
+if (!window.__waitHook) {
+    window.__waitHook = {pending: 0, lastActivity: Date.now()};
+    var hook = window.__waitHook;
+    var done = function () { hook.pending--; hook.lastActivity = Date.now(); };
+    var originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function () {
+            hook.pending++;
+            hook.lastActivity = Date.now();
+            return originalFetch.apply(this, arguments).finally(done);
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        hook.pending++;
+        hook.lastActivity = Date.now();
+        this.addEventListener('loadend', done);
+        return originalSend.apply(this, arguments);
+    };
+}
+"""
+
+NETWORK_IDLE_JS = """
+var hook = window.__waitHook;
+if (!hook) { return null; }
+return hook.pending <= 0 && (Date.now() - hook.lastActivity) >= arguments[0];
+"""
+
+XPATH_EXISTS_JS = """
+return document.evaluate(arguments[0], document, null,
+    XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null;
+"""
+
+def setup_driver(headless=False, fast=False):
     # driver = uc.Chrome('zoho1')
-    driver = webdriver.Chrome()
+    options = webdriver.ChromeOptions()
+    if headless or fast:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1366,900")
+    if fast:
+        # Hand control back at DOMContentLoaded and never fetch images
+        options.page_load_strategy = 'eager'
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    driver = webdriver.Chrome(options=options)
+    if fast:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": FAST_MODE_BLOCKED_URLS})
     return driver
 
 class WebDriverBase:
-    def __init__(self):
-        self.driver = setup_driver()
-        self.driver.implicitly_wait(10)  # Set a default implicit wait
+    def __init__(self, driver=None, headless=False, fast=False):
+        self.driver = driver or setup_driver(headless=headless, fast=fast)
+        # No implicit wait: every wait is explicit, and a missing element must fail at once instead of
+        # stalling find_element calls, including the ones inside expected_conditions predicates
+        self.driver.implicitly_wait(0)
+        # The most recent waits per step; long-lived pooled drivers would otherwise keep every one
+        self.wait_timings = defaultdict(lambda: deque(maxlen=1000))
+        self.wait_timeouts = defaultdict(int)
 
     def quit(self):
         self.driver.quit()
@@ -25,7 +90,7 @@ class WebDriverBase:
             )
             return element
         except TimeoutException:
-            print(f"Element not found: {value}")
+            logger.warning(f"Element not found: {value}")
             return None
 
     def click_element(self, by, value):
@@ -35,8 +100,85 @@ class WebDriverBase:
                 element.click()
                 return True
         except WebDriverException:
-            print(f"Standard click failed for element: {value}. Trying JavaScript click.")
+            logger.warning(f"Standard click failed for element: {value}. Trying JavaScript click.")
             if element:
                 self.driver.execute_script("arguments[0].click();", element) 
                 return True
-        return False
\ No newline at end of file
+        return False
+
+    def wait_until(self, condition, timeout=10, step='wait', poll_frequency=0.1):
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=poll_frequency).until(condition)
+        except TimeoutException:
+            outcome = 'timeout'
+            self.wait_timeouts[step] += 1
+            logger.warning(f"Timed out after {timeout}s waiting for {step}", extra={"step": step})
+            return None
+        finally:
+            elapsed = time.perf_counter() - start
+            self.wait_timings[step].append(elapsed)
+            WAIT_SECONDS.observe(elapsed, step=step, outcome=outcome)
+
+    def xpath_exists(self, xpath):
+        # Evaluated in the page, one round trip per check
+        return self.driver.execute_script(XPATH_EXISTS_JS, xpath)
+
+    def wait_for_document_ready(self, timeout=10, step='document_ready'):
+        return self.wait_until(
+            lambda driver: driver.execute_script("return document.readyState") in ('interactive', 'complete'),
+            timeout, step
+        )
+
+    def install_network_hook(self):
+        self.driver.execute_script(NETWORK_HOOK_JS)
+
+    def wait_for_network_idle(self, idle_ms=500, timeout=10, step='network_idle'):
+        self.install_network_hook()
+        return self.wait_until(
+            lambda driver: driver.execute_script(NETWORK_IDLE_JS, idle_ms),
+            timeout, step
+        )
+
+    def wait_for_any_xpath(self, xpaths, timeout=10, step='any_xpath'):
+        def first_present(driver):
+            for xpath in xpaths:
+                if self.xpath_exists(xpath):
+                    return xpath
+            return False
+        return self.wait_until(first_present, timeout, step)
+
+    def wait_for_knowledge_panel(self, timeout=10):
+        # Either the panel title renders or the plain results list does (no panel for this query).
+        # True for a panel, False for results without one, None when neither loaded in time.
+        found = self.wait_for_any_xpath(
+            ["//div[@data-attrid='title']", "//div[@id='rso']", "//div[@id='search']"],
+            timeout, 'knowledge_panel'
+        )
+        if found is None:
+            return None
+        return found == "//div[@data-attrid='title']"
+
+    def wait_for_clickable(self, by, value, timeout=10, step='clickable'):
+        return self.wait_until(EC.element_to_be_clickable((by, value)), timeout, step)
+
+    def wait_for_modal_close(self, by, value, timeout=10, step='modal_close'):
+        return self.wait_until(EC.invisibility_of_element_located((by, value)), timeout, step)
+
+    def wait_for_upload_complete(self, attach_by, attach_value, timeout=30, step='upload_complete'):
+        # The attach button is enabled once the file has been read and the preview request has finished
+        if self.wait_for_clickable(attach_by, attach_value, timeout, step) is None:
+            return False
+        return self.wait_for_network_idle(timeout=timeout, step=step) is not None
+
+    def wait_summary(self):
+        summary = {}
+        for step, durations in self.wait_timings.items():
+            summary[step] = {
+                "count": len(durations),
+                "total": sum(durations),
+                "max": max(durations),
+                "timeouts": self.wait_timeouts.get(step, 0)
+            }
+        return summary
@@ -0,0 +1,100 @@
+import hashlib
+import html
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+IMAGE_MAGIC = {
+    '.jpg': b'\xff\xd8\xff\xe0\x00\x10JFIF\x00',
+    '.png': b'\x89PNG\r\n\x1a\n',
+}
+
+
+def image_bytes(name, size=24 * 1024):
+    # Deterministic per name, so every run stores (and dedups) the same objects
+    head = IMAGE_MAGIC.get(os.path.splitext(name)[1], b'')
+    seed = hashlib.sha256(name.encode('utf-8')).digest()
+    return head + (seed * (size // len(seed) + 1))[:size - len(head)]
+
+
+class SearchFixtureServer:
+    # Stands in for the results page: each query gets one of the recorded pages, picked by a stable hash
+    def __init__(self, fixtures_dir=FIXTURES_DIR, no_panel_ratio=0.1, latency=0.05, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.no_panel_ratio = no_panel_ratio
+        self.panels = []
+        self.no_panel = None
+        for name in sorted(os.listdir(fixtures_dir)):
+            if not name.endswith('.html'):
+                continue
+            with open(os.path.join(fixtures_dir, name), 'r', encoding='utf-8') as fixture:
+                if name.startswith('no_panel'):
+                    self.no_panel = fixture.read()
+                else:
+                    self.panels.append(fixture.read())
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self):
+        return f"{self.url}/search?q={{query}}&hl=en"
+
+    def page_for(self, query):
+        bucket = int(hashlib.sha1(query.encode('utf-8')).hexdigest()[:8], 16)
+        if self.no_panel and (bucket % 1000) / 1000 < self.no_panel_ratio:
+            template = self.no_panel
+        else:
+            template = self.panels[bucket % len(self.panels)]
+        return template.replace('{{base_url}}', self.url).replace('{{query}}', html.escape(query))
+
+    def _handler_class(self):
+        fixtures = self
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/search':
+                    fixtures.requests += 1
+                    time.sleep(fixtures.latency)
+                    query = parse_qs(url.query).get('q', [''])[0]
+                    self._send(200, fixtures.page_for(query).encode('utf-8'), 'text/html; charset=utf-8')
+                elif url.path.startswith('/images/'):
+                    name = url.path.rsplit('/', 1)[-1]
+                    content_type = 'image/png' if name.endswith('.png') else 'image/jpeg'
+                    self._send(200, image_bytes(name), content_type)
+                elif url.path.startswith('/static/'):
+                    self._send(200, b'{}' if url.path.endswith('.json') else b'', 'text/plain')
+                else:
+                    self._send(404, b'', 'text/plain')
+
+            def log_message(self, format, *args):
+                pass
+
+        return FixtureHandler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='search-fixtures', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,355 @@
+import csv
+import io
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+LISTING_WINDOW = 2000
+
+ID_SEGMENT = re.compile(r'/\d{6,}(?=/|$)')
+
+ACCOUNT_FIELDS = [
+    ("Account_Name", "Account Name", "text", 200),
+    ("Website", "Website", "website", 255),
+    ("Number", "Number", "phone", 30),
+    ("Address", "Address", "textarea", 2000),
+    ("Billing_Street", "Billing Street", "textarea", 250),
+    ("Billing_City", "Billing City", "text", 30),
+    ("Billing_State", "Billing State", "text", 30),
+    ("Billing_Code", "Billing Code", "text", 30),
+    ("Billing_Country", "Billing Country", "text", 30),
+    ("Images", "Images", "textarea", 32000),
+    ("Image_Upload_1", "Image Upload 1", "imageupload", None),
+    ("Image_Upload_2", "Image Upload 2", "imageupload", None),
+    ("Image_Upload_3", "Image Upload 3", "imageupload", None),
+]
+
+LAYOUT_ID = "5725767000000091055"
+
+# Bulk Read columns that aren't plain account fields
+BULK_READ_COLUMNS = {
+    "Id": lambda account: account['id'],
+    "Layout": lambda account: account['$layout_id']['id'],
+    "Created_Time": lambda account: account.get('Created_Time') or account['Modified_Time'],
+}
+
+
+def zip_csv(header, rows, name='records.csv'):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(header)
+    writer.writerows(rows)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(name, text.getvalue())
+    return buffer.getvalue()
+
+
+def unzip_csv(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        name = next(name for name in archive.namelist() if name.lower().endswith('.csv'))
+        return list(csv.reader(io.TextIOWrapper(archive.open(name), encoding='utf-8-sig', newline='')))
+
+
+def make_accounts(count, seed=7):
+    rng = random.Random(seed)
+    streets = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St", "Lake Blvd"]
+    cities = ["Springfield", "Riverside", "Fairview", "Madison", "Georgetown"]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    accounts = []
+    for index in range(count):
+        # A few accounts share a timestamp so tie handling is exercised too
+        modified = start + timedelta(seconds=index - index % 3)
+        accounts.append({
+            "id": str(5725767000001000000 + index),
+            "Account_Name": f"Account {index}",
+            "Address": f"{rng.randint(1, 9999)} {rng.choice(streets)}, {rng.choice(cities)}",
+            "Modified_Time": modified.isoformat(),
+            "$layout_id": {"id": LAYOUT_ID, "name": "Standard"},
+        })
+    return accounts
+
+
+class MockZohoServer:
+    # Serves the slice of the Zoho CRM and accounts APIs the sync uses, with tunable misbehaviour.
+    # Bulk jobs finish as soon as they are created; point bulk_url, bulk_upload_url and
+    # bulk_download_url at bulk_urls() to use them.
+    def __init__(self, accounts, latency=0.02, jitter=0.01, rate_limit_ratio=0.0, retry_after=0,
+                 host='127.0.0.1', port=0, seed=7, bulk_page_size=200000):
+        self.accounts = sorted(accounts, key=lambda account: account['Modified_Time'])
+        self.by_id = {account['id']: account for account in self.accounts}
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_file_id = 0
+        self.bulk_page_size = bulk_page_size
+        self._bulk_jobs = {}
+        self._uploads = {}
+        self._results = {}
+        self._next_job_id = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def bulk_urls(self):
+        return {
+            "bulk_url": f"{self.url}/crm/bulk/v2",
+            "bulk_upload_url": f"{self.url}/crm/v2/upload",
+            "bulk_download_url": self.url,
+        }
+
+    def total_calls(self, exclude=('POST /oauth/v2/token',)):
+        return sum(count for key, count in self.calls.items() if key not in exclude)
+
+    def _handler_class(self):
+        mock = self
+
+        class MockZohoHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status, payload=None, headers=None):
+                # bytes are a bulk result zip, anything else is JSON
+                if isinstance(payload, bytes):
+                    body, content_type = payload, 'application/zip'
+                else:
+                    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                    content_type = 'application/json'
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return self.rfile.read(length) if length else b''
+
+            def _dispatch(self, method):
+                url = urlparse(self.path)
+                body = self._body()
+                key = f"{method} {ID_SEGMENT.sub('/{id}', url.path)}"
+                with mock._lock:
+                    mock.calls[key] += 1
+                    throttled = url.path != '/oauth/v2/token' and mock._rng.random() < mock.rate_limit_ratio
+                    delay = mock.latency + mock._rng.uniform(0, mock.jitter)
+                time.sleep(delay)
+
+                if throttled:
+                    with mock._lock:
+                        mock.rate_limited += 1
+                    self._send(429, {"code": "TOO_MANY_REQUESTS", "status": "error"},
+                               {"Retry-After": str(mock.retry_after), "X-RATELIMIT-REMAINING": "0"})
+                    return
+                status, payload = mock.route(method, url.path, parse_qs(url.query), self.headers, body)
+                self._send(status, payload)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PUT(self):
+                self._dispatch('PUT')
+
+            def log_message(self, format, *args):
+                pass
+
+        return MockZohoHandler
+
+    def _record_results(self, records):
+        return [
+            {"code": "SUCCESS", "status": "success", "message": "record updated",
+             "details": {"id": record.get('id') or str(5725767009000000000 + index)}}
+            for index, record in enumerate(records)
+        ]
+
+    def route(self, method, path, query, headers, body):
+        if path == '/oauth/v2/token':
+            return 200, {"access_token": f"mock-{time.time_ns()}", "expires_in": 3600}
+        if path.startswith('/crm/bulk/v2/'):
+            return self.route_bulk(method, path[len('/crm/bulk/v2'):], body)
+        if method == 'GET' and path in self._results:
+            return 200, self._results[path]
+        if path == '/crm/v2/upload' and method == 'POST':
+            return self.upload(headers, body)
+
+        match = re.fullmatch(r'/crm/v2(?:\.1)?/(\w+)(?:/(\w+))?', path)
+        if not match:
+            return 404, {"code": "INVALID_URL_PATTERN"}
+        resource, item = match.groups()
+
+        if resource == 'settings' and item == 'fields':
+            return 200, {"fields": [
+                {"api_name": api_name, "field_label": label, "data_type": data_type, "length": length,
+                 "read_only": False}
+                for api_name, label, data_type, length in ACCOUNT_FIELDS
+            ]}
+        if resource == 'settings' and item == 'layouts':
+            return 200, {"layouts": [{"id": LAYOUT_ID, "name": "Standard", "profiles": [{"default": True}]}]}
+
+        if resource == 'files' and method == 'POST':
+            with self._lock:
+                self._next_file_id += 1
+                file_id = f"enc{self._next_file_id:012d}"
+            return 200, {"data": [{"code": "SUCCESS", "details": {"id": file_id}}]}
+
+        if resource != 'Accounts':
+            return 404, {"code": "INVALID_MODULE"}
+
+        if method == 'GET' and item is None:
+            return self.list_accounts(query, headers)
+        if method == 'GET':
+            account = self.by_id.get(item)
+            return (200, {"data": [account]}) if account else (204, None)
+        if method in ('POST', 'PUT'):
+            records = json.loads(body or b'{}').get('data', [])
+            if item and item != 'upsert':
+                records = [dict(record, id=item) for record in records]
+            return (201 if method == 'POST' else 200), {"data": self._record_results(records)}
+        return 405, {"code": "METHOD_NOT_ALLOWED"}
+
+    def _new_job_id(self):
+        with self._lock:
+            self._next_job_id += 1
+            return str(5725767010000000000 + self._next_job_id)
+
+    def upload(self, headers, body):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {headers.get('Content-Type')}\r\n\r\n".encode('utf-8') + body
+        )
+        parts = [part for part in message.iter_parts() if part.get_filename()]
+        if not parts:
+            return 400, {"code": "INVALID_DATA", "message": "No file in the upload"}
+        with self._lock:
+            self._next_file_id += 1
+            file_id = f"bulk{self._next_file_id:012d}"
+            self._uploads[file_id] = parts[0].get_payload(decode=True)
+        return 200, {"status": "success", "code": "FILE_UPLOAD_SUCCESS", "details": {"file_id": file_id}}
+
+    def route_bulk(self, method, path, body):
+        match = re.fullmatch(r'/(read|write)(?:/(\d+))?(/result)?', path)
+        if not match:
+            return 404, {"code": "INVALID_URL_PATTERN"}
+        kind, job_id, result = match.groups()
+        if method == 'POST' and job_id is None:
+            return self.create_read_job(json.loads(body)) if kind == 'read' else self.create_write_job(json.loads(body))
+        job = self._bulk_jobs.get(job_id)
+        if method != 'GET' or job is None:
+            return 404, {"code": "RESOURCE_NOT_FOUND"}
+        if kind == 'read' and result:
+            return 200, job["result_file"]
+        if kind == 'read':
+            return 200, {"data": [job["status"]]}
+        return 200, job["status"]
+
+    def create_read_job(self, payload):
+        query = payload.get('query', {})
+        page = int(query.get('page', 1))
+        fields = query.get('fields') or ['Id'] + [api_name for api_name, _, _, _ in ACCOUNT_FIELDS]
+        start = (page - 1) * self.bulk_page_size
+        accounts = self.accounts[start:start + self.bulk_page_size]
+        rows = [
+            [BULK_READ_COLUMNS[field](account) if field in BULK_READ_COLUMNS else account.get(field, '')
+             for field in fields]
+            for account in accounts
+        ]
+        job_id = self._new_job_id()
+        self._bulk_jobs[job_id] = {
+            "status": {"id": job_id, "operation": "read", "state": "COMPLETED", "result": {
+                "page": page, "count": len(rows), "more_records": start + len(rows) < len(self.accounts),
+                "download_url": f"/crm/bulk/v2/read/{job_id}/result"
+            }},
+            "result_file": zip_csv(fields, rows, f"{job_id}.csv"),
+        }
+        return 201, {"status": "success", "data": [{"status": "success", "details": {"id": job_id}}]}
+
+    def create_write_job(self, payload):
+        resource = payload['resource'][0]
+        data = self._uploads.get(resource['file_id'])
+        if data is None:
+            return 400, {"code": "INVALID_DATA", "message": "Unknown file_id"}
+        columns = {mapping['index']: mapping['api_name'] for mapping in resource['field_mappings']}
+        rows = unzip_csv(data)
+        header, records = rows[0], [
+            {columns[index]: value for index, value in enumerate(row) if index in columns and value != ''}
+            for row in rows[1:]
+        ]
+
+        results = []
+        for row, record in zip(rows[1:], records):
+            if payload['operation'] == 'insert':
+                record_id = str(5725767009000000000 + len(self.by_id))
+                account = dict(record, id=record_id, Modified_Time=datetime.now(timezone.utc).isoformat(),
+                               **{"$layout_id": {"id": LAYOUT_ID, "name": "Standard"}})
+                self.accounts.append(account)
+                self.by_id[record_id] = account
+                results.append(row + ['ADDED', record_id, ''])
+                continue
+            account = self.by_id.get(record.get(resource.get('find_by', 'id')))
+            if account is None:
+                results.append(row + ['SKIPPED', '', 'RECORD_NOT_FOUND'])
+                continue
+            account.update({key: value for key, value in record.items() if key != 'id'})
+            results.append(row + ['UPDATED', account['id'], ''])
+
+        job_id = self._new_job_id()
+        download_path = f"/v2/crm/mock/bulk-write/{job_id}/{job_id}.zip"
+        self._results[download_path] = zip_csv(header + ['STATUS', 'RECORD_ID', 'ERRORS'], results, f"{job_id}.csv")
+        self._bulk_jobs[job_id] = {"status": {
+            "id": job_id, "operation": payload['operation'], "status": "COMPLETED",
+            "result": {"download_url": download_path}
+        }}
+        return 201, {"status": "success", "details": {"id": job_id}}
+
+    def list_accounts(self, query, headers):
+        page = int(query.get('page', ['1'])[0])
+        per_page = min(int(query.get('per_page', ['200'])[0]), 200)
+        if page * per_page > LISTING_WINDOW:
+            return 400, {"code": "LIMIT_REACHED", "message": "Only the first 2000 records can be listed"}
+
+        accounts = self.accounts
+        since = headers.get('If-Modified-Since')
+        if since:
+            since = datetime.fromisoformat(since)
+            accounts = [account for account in accounts if datetime.fromisoformat(account['Modified_Time']) > since]
+        if not accounts:
+            return (304 if since else 204), None
+
+        start = (page - 1) * per_page
+        window = accounts[start:start + per_page]
+        return 200, {
+            "data": window,
+            "info": {"page": page, "per_page": per_page, "count": len(window),
+                     "more_records": start + per_page < len(accounts)}
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-zoho', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,218 @@
+# Run from the repository root: python -m benchmarks.run_benchmark [--save-baseline]
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from base.log import configure_logging
+from base.metrics import (
+    API_REQUEST_SECONDS, API_RETRIES, EXTRACT_SECONDS, IMAGE_DOWNLOAD_SECONDS, IMAGE_UPLOAD_SECONDS, METRICS,
+    RATE_LIMITED, SCRAPE_SECONDS, WAIT_SECONDS,
+)
+from benchmarks.fixture_server import SearchFixtureServer
+from benchmarks.mock_zoho import MockZohoServer, make_accounts
+from crm_integration.crm_client import ZohoCRMClient
+from data_scraper.address_store import SYNCED
+from pipeline.account_pipeline import AccountPipeline
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Which way is better for each compared figure; anything not listed is reported but never gated
+HIGHER_IS_BETTER = {'addresses_per_min'}
+LOWER_IS_BETTER = {'api_calls_per_account', 'peak_rss_mb'}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentiles(histogram, **labels):
+    p50 = histogram.quantile(0.5, **labels)
+    p95 = histogram.quantile(0.95, **labels)
+    return {
+        "count": histogram.merged(**labels)[-2],
+        "p50": round(p50, 4) if p50 is not None else None,
+        "p95": round(p95, 4) if p95 is not None else None,
+    }
+
+
+def stage_report():
+    stages = {
+        "scrape": percentiles(SCRAPE_SECONDS),
+        "panel_wait": percentiles(WAIT_SECONDS, step='knowledge_panel'),
+        "extract": percentiles(EXTRACT_SECONDS),
+        "image_download": percentiles(IMAGE_DOWNLOAD_SECONDS),
+        "image_upload": percentiles(IMAGE_UPLOAD_SECONDS, method='api'),
+    }
+    for endpoint in API_REQUEST_SECONDS.label_values('endpoint'):
+        stages[f"api {endpoint}"] = percentiles(API_REQUEST_SECONDS, endpoint=endpoint)
+    return stages
+
+
+def run(accounts=200, api_latency=0.02, rate_limit_ratio=0.02, search_latency=0.05, no_panel_ratio=0.1,
+        keep_work_dir=False):
+    METRICS.reset()
+    zoho = MockZohoServer(make_accounts(accounts), latency=api_latency, rate_limit_ratio=rate_limit_ratio).start()
+    fixtures = SearchFixtureServer(latency=search_latency, no_panel_ratio=no_panel_ratio).start()
+
+    # The client keeps its state files in the working directory, so every run starts from an empty one
+    work_dir = tempfile.mkdtemp(prefix='zoho-benchmark-')
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    client = None
+    try:
+        with open('config.json', 'w') as config_file:
+            json.dump({
+                "access_token": "benchmark",
+                "refresh_token": "benchmark",
+                "client_id": "benchmark",
+                "client_secret": "benchmark",
+                "api_domain": zoho.url,
+                "accounts_url": zoho.url,
+                "search_url": fixtures.search_url,
+                "scrape_requests_per_minute": 0,
+                "fast_scrape": True,
+                "image_sync": "api"
+            }, config_file)
+
+        client = ZohoCRMClient(config_path='config.json', state_path='sync_state.json')
+        start = time.perf_counter()
+        # The same path as `sync --once`
+        AccountPipeline(client).run_once(incremental=True, interval=0.1)
+        elapsed = time.perf_counter() - start
+        synced = len(client.address_store.addresses_with_status(SYNCED))
+    finally:
+        if client:
+            client.close()
+        zoho.stop()
+        fixtures.stop()
+        os.chdir(previous_dir)
+        if not keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "parameters": {
+            "accounts": accounts,
+            "api_latency": api_latency,
+            "rate_limit_ratio": rate_limit_ratio,
+            "search_latency": search_latency,
+            "no_panel_ratio": no_panel_ratio
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "accounts_synced": synced,
+        "addresses_per_min": round(accounts / elapsed * 60, 1),
+        "api_calls_per_account": round(zoho.total_calls() / accounts, 2),
+        "api_calls": dict(zoho.calls),
+        "rate_limited": RATE_LIMITED.total(),
+        "retries": API_RETRIES.total(),
+        "peak_rss_mb": peak_rss_mb(),
+        "browser_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "stages": stage_report(),
+        "work_dir": work_dir if keep_work_dir else None
+    }
+
+
+def gated_figures(report):
+    figures = {name: report.get(name) for name in HIGHER_IS_BETTER | LOWER_IS_BETTER}
+    for stage, summary in report.get('stages', {}).items():
+        figures[f"{stage} p50"] = summary.get('p50')
+        figures[f"{stage} p95"] = summary.get('p95')
+    return figures
+
+
+def compare(report, baseline, tolerance=0.15):
+    # Returns (rows, regressions); a row is (name, baseline value, current value, relative change)
+    rows = []
+    regressions = []
+    current = gated_figures(report)
+    for name, before in sorted(gated_figures(baseline).items()):
+        after = current.get(name)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change))
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_report(report, rows=None, regressions=()):
+    print(f"Accounts: {report['parameters']['accounts']} in {report['elapsed_seconds']}s "
+          f"({report['accounts_synced']} synced)")
+    print(f"Addresses/min: {report['addresses_per_min']}")
+    print(f"API calls per account: {report['api_calls_per_account']} "
+          f"({report['rate_limited']} rate limited, {report['retries']} retries)")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB (browser {report['browser_peak_rss_mb']} MB)")
+    print()
+    print(f"{'stage':<48}{'count':>8}{'p50':>10}{'p95':>10}")
+    for stage, summary in report['stages'].items():
+        p50 = '-' if summary['p50'] is None else f"{summary['p50']:.3f}"
+        p95 = '-' if summary['p95'] is None else f"{summary['p95']:.3f}"
+        print(f"{stage:<48}{summary['count']:>8}{p50:>10}{p95:>10}")
+
+    if rows:
+        print()
+        print(f"{'compared to baseline':<48}{'before':>10}{'after':>10}{'change':>10}")
+        for name, before, after, change in rows:
+            flag = '  REGRESSION' if name in regressions else ''
+            print(f"{name:<48}{before:>10.3f}{after:>10.3f}{change:>+10.1%}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline sync benchmark against a mock Zoho API and recorded search pages")
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--api-latency', type=float, default=0.02, help="seconds added to every mock API call")
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.02, help="share of API calls answered with 429")
+    parser.add_argument('--search-latency', type=float, default=0.05, help="seconds added to every results page")
+    parser.add_argument('--no-panel-ratio', type=float, default=0.1, help="share of addresses without a knowledge panel")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="relative slowdown allowed before failing")
+    parser.add_argument('--output', help="also write the full report as JSON")
+    parser.add_argument('--keep-work-dir', action='store_true')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level, fmt='text')
+    report = run(args.accounts, args.api_latency, args.rate_limit_ratio, args.search_latency, args.no_panel_ratio,
+                 args.keep_work_dir)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if not report['accounts_synced']:
+        # Every scrape failed (usually no Chrome or chromedriver), so the timings measure nothing
+        print_report(report)
+        print("\nNo account was synced; check the scrape warnings above. Not saving or comparing this run")
+        return 1
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print_report(report)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print_report(report)
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('parameters') != report['parameters']:
+        print(f"Baseline was recorded with {baseline.get('parameters')}; figures may not be comparable")
+    rows, regressions = compare(report, baseline, args.tolerance)
+    print_report(report, rows, regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
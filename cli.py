@@ -0,0 +1,259 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import signal
+import sys
+from base.log import configure_logging
+
+# Only the lightweight modules are imported up front; each command imports what it needs, so
+# administrative commands never load selenium and Chrome starts only when a scrape is queued
+
+logger = logging.getLogger(__name__)
+
+ORGS_PATH = 'orgs.json'
+
+
+def make_client(args):
+    from crm_integration.crm_client import ZohoCRMClient
+    client = ZohoCRMClient(config_path=args.config)
+    config = client.config
+    configure_logging(args.log_level or config.get('log_level', 'INFO'),
+                      args.log_format or config.get('log_format', 'json'))
+    return client
+
+
+def run_multi_org(args):
+    from base.metrics import MetricsServer
+    from base.rate_limit import DomainRateLimiter
+    from crm_integration.org_registry import OrgRegistry
+    from pipeline.multi_org import MultiOrgService
+    from pipeline.org_leases import OrgLeaseStore
+
+    registry = OrgRegistry(args.orgs)
+    settings = registry.settings
+    configure_logging(args.log_level or settings.get('log_level', 'INFO'),
+                      args.log_format or settings.get('log_format', 'json'))
+    lease_store = OrgLeaseStore(settings['lease_db']) if settings.get('lease_db') else None
+    service = MultiOrgService(
+        registry, lease_store=lease_store, owner=settings.get('worker_name'),
+        browsers=settings.get('browsers', 4), lease_ttl=settings.get('lease_ttl', 60),
+        poll_interval=settings.get('poll_interval', 30),
+        scrape_rate_limiter=DomainRateLimiter(
+            per_minute=settings.get('scrape_requests_per_minute', 30), burst=settings.get('scrape_burst'),
+            rates=settings.get('scrape_rate_limits')
+        )
+    )
+    metrics_server = MetricsServer(port=settings['metrics_port']) if settings.get('metrics_port') else None
+
+    def handle_signal(signum, frame):
+        logger.info("Shutting down, draining in-flight accounts for every org...")
+        service.stop()
+        if metrics_server:
+            metrics_server.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    if metrics_server:
+        metrics_server.start()
+    service.start()
+    service.wait()
+
+
+def run_service(client):
+    from base.metrics import MetricsServer
+    from crm_integration.webhook_receiver import NotificationChannel, NotificationReceiver
+    from pipeline.account_pipeline import AccountPipeline
+
+    config = client.config
+    notify_url = config.get('notify_url')
+
+    # With notifications on, polling only reconciles events that were missed
+    poll_interval = config.get('fallback_poll_interval', 900) if notify_url else 30
+    service = AccountPipeline(client, poll_interval=poll_interval)
+
+    receiver = channel = None
+    if notify_url:
+        receiver = NotificationReceiver(service.notify, config['notify_token'], port=config.get('notify_port', 8085))
+        channel = NotificationChannel(client, notify_url, config['notify_token'])
+
+    metrics_server = MetricsServer(port=config['metrics_port']) if config.get('metrics_port') else None
+    profile_args = (config.get('profile_output', 'poll_cycle.prof'), config.get('profile_engine', 'cprofile'))
+    if config.get('profile_first_cycle'):
+        service.profile_next_cycle(*profile_args)
+
+    def handle_signal(signum, frame):
+        logger.info("Shutting down, draining in-flight accounts...")
+        if receiver:
+            channel.stop()
+            receiver.stop()
+        service.stop()
+        if metrics_server:
+            metrics_server.stop()
+
+    def handle_profile_signal(signum, frame):
+        # kill -USR1 <pid> profiles the next poll cycle of a running service
+        service.profile_next_cycle(*profile_args)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, handle_profile_signal)
+
+    if metrics_server:
+        metrics_server.start()
+    service.start()
+    if receiver:
+        receiver.start()
+        channel.start()
+    service.wait()
+
+
+def cmd_sync(args):
+    if not args.once and os.path.exists(args.orgs):
+        return run_multi_org(args)
+
+    client = make_client(args)
+    try:
+        if args.once:
+            from pipeline.account_pipeline import AccountPipeline
+
+            # One pass over changed accounts through the scrape queue, without polling or notifications
+            AccountPipeline(client).run_once(incremental=not args.full)
+        else:
+            run_service(client)
+    finally:
+        client.close()
+
+
+def cmd_scrape(args):
+    addresses = list(args.addresses)
+    if args.file:
+        with open(args.file, 'r') as address_file:
+            addresses.extend(line.strip() for line in address_file if line.strip())
+
+    client = make_client(args)
+    try:
+        for address in addresses:
+            try:
+                business = client.scraper.scrape_address(address, download=not args.no_images)
+            except Exception as e:
+                logger.warning(f"Error extracting data for {address}: {e}")
+                continue
+            print(json.dumps(business))
+    finally:
+        client.close()
+
+
+def cmd_import_csv(args):
+    client = make_client(args)
+    try:
+        client.monitor_csv_and_update_crm(args.csv_path, poll_interval=args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+def cmd_fields(args):
+    client = make_client(args)
+    try:
+        if args.json:
+            metadata = client.metadata.module(args.module)
+            if metadata is None:
+                return 1
+            print(json.dumps(metadata.fields, indent=2))
+        elif client.get_field_metadata(args.module) is None:
+            return 1
+    finally:
+        client.close()
+
+
+def cmd_bulk(args):
+    from crm_integration.bulk import ZohoBulkClient
+
+    client = make_client(args)
+    bulk_client = ZohoBulkClient(client)
+    try:
+        if args.action == 'export':
+            fields = args.fields.split(',') if args.fields else None
+            output = open(args.output, 'w', newline='') if args.output else sys.stdout
+            try:
+                writer = None
+                for row in bulk_client.iter_read(args.module, fields=fields):
+                    if writer is None:
+                        writer = csv.DictWriter(output, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            from pipeline.account_pipeline import AccountPipeline
+
+            # Accounts are written back in Bulk Write batches instead of one PUT each. No poller or
+            # notification worker: the Bulk Read job is the listing, paging GET /Accounts is what it replaces
+            service = AccountPipeline(client, bulk_client=bulk_client)
+            service.start(poll=False)
+            try:
+                service.backfill(bulk_client)
+                service.wait_for_queue()
+            finally:
+                # Lets the later stages drain what was already scraped
+                service.stop()
+    finally:
+        client.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='zoho-data', description="Enrich Zoho CRM accounts with scraped business data")
+    parser.add_argument('--config', default='config.json', help="Zoho credentials and settings file")
+    parser.add_argument('--log-level', help="Overrides log_level from the config")
+    parser.add_argument('--log-format', choices=('json', 'text'), help="Overrides log_format from the config")
+    commands = parser.add_subparsers(dest='command')
+
+    sync = commands.add_parser('sync', help="Run the enrichment service (the default command)")
+    sync.add_argument('--once', action='store_true', help="Process changed accounts once and exit")
+    sync.add_argument('--full', action='store_true', help="With --once, ignore the sync state and list every account")
+    sync.add_argument('--orgs', default=ORGS_PATH, help="Org registry; when it exists every org in it is served")
+    sync.set_defaults(handler=cmd_sync)
+
+    scrape = commands.add_parser('scrape', help="Scrape business details for addresses and print them as JSON lines")
+    scrape.add_argument('addresses', nargs='*')
+    scrape.add_argument('--file', help="File with one address per line")
+    scrape.add_argument('--no-images', action='store_true', help="Don't download the business images")
+    scrape.set_defaults(handler=cmd_scrape)
+
+    import_csv = commands.add_parser('import-csv', help="Write rows appended to a CSV file into Zoho")
+    import_csv.add_argument('csv_path')
+    import_csv.add_argument('--poll-interval', type=float, default=10)
+    import_csv.set_defaults(handler=cmd_import_csv)
+
+    fields = commands.add_parser('fields', help="List the fields of a module")
+    fields.add_argument('--module', default='Accounts')
+    fields.add_argument('--json', action='store_true', help="Print the full field metadata as JSON")
+    fields.set_defaults(handler=cmd_fields)
+
+    bulk = commands.add_parser('bulk', help="Bulk Read export, or a full-org backfill through the pipeline")
+    bulk.add_argument('action', choices=('export', 'backfill'))
+    bulk.add_argument('--module', default='Accounts')
+    bulk.add_argument('--fields', help="Comma-separated API names to export")
+    bulk.add_argument('--output', help="CSV file to write; defaults to stdout")
+    bulk.set_defaults(handler=cmd_bulk)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # A bare invocation keeps running the service, as main.py always did
+        args = parser.parse_args(argv + ['sync'])
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from crm_integration.sync_state import SyncState
+from data_scraper.normalize import normalize_address, normalize_name, normalize_phone, trigrams, website_domain
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+SKIP = 'skip'
+
+# How much each signal counts towards a match; only fields present on both sides are scored
+FIELD_WEIGHTS = {"phone": 0.35, "domain": 0.25, "name": 0.25, "address": 0.15}
+
+# A name trigram held by more than this share of the index says nothing about identity ("caf", "st ");
+# small indexes keep every gram up to MIN_GRAM_POSTINGS
+MAX_GRAM_SHARE = 0.01
+MIN_GRAM_POSTINGS = 50
+# Candidates come from the rarest few grams of the name; enough to find a near-identical name
+MAX_PROBE_GRAMS = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class Match:
+    def __init__(self, action, record_id=None, score=0.0):
+        self.action = action
+        self.record_id = record_id
+        self.score = score
+
+    def __repr__(self):
+        return f"Match({self.action!r}, {self.record_id!r}, {self.score:.2f})"
+
+
+class AccountIndex:
+    # Local copy of the match keys of every account, so rows can be routed without search API calls.
+    # The Billing_* fields stay out of the address key: the CSV import fills them with placeholder text.
+    def __init__(self, db_path='account_index.db', state_path=None, phone_region='US', threshold=0.75,
+                 phone_fields=('Phone', 'Number'), address_fields=('Address',), max_candidates=50):
+        self.db_path = db_path
+        self.sync_state = SyncState(state_path or f"{os.path.splitext(db_path)[0]}_state.json")
+        self.phone_region = phone_region
+        self.threshold = threshold
+        self.phone_fields = phone_fields
+        self.address_fields = address_fields
+        self.max_candidates = max_candidates
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._keys = {}
+        self._by_phone = defaultdict(set)
+        self._by_domain = defaultdict(set)
+        self._by_address = defaultdict(set)
+        self._by_gram = defaultdict(set)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        self.load()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def key_for(self, record):
+        phone = next((record[field] for field in self.phone_fields if record.get(field)), '')
+        address = ' '.join(str(record[field]) for field in self.address_fields if record.get(field))
+        return {
+            "name": normalize_name(record.get('Account_Name') or record.get('Name')),
+            "phone": normalize_phone(phone, self.phone_region),
+            "domain": website_domain(record.get('Website')),
+            "address": normalize_address(address),
+        }
+
+    def _address_block(self, address):
+        # House number plus the next token ("123 main") keeps neighbours on one street in separate blocks
+        tokens = address.split()
+        return ' '.join(tokens[:2]) if len(tokens) >= 2 else None
+
+    def _prepare(self, key):
+        return dict(key, grams=trigrams(key["name"]), address_tokens=frozenset(key["address"].split()))
+
+    def _index(self, record_id, key):
+        self._keys[record_id] = self._prepare(key)
+        if key["phone"]:
+            self._by_phone[key["phone"]].add(record_id)
+        if key["domain"]:
+            self._by_domain[key["domain"]].add(record_id)
+        block = self._address_block(key["address"])
+        if block:
+            self._by_address[block].add(record_id)
+        for gram in self._keys[record_id]["grams"]:
+            self._by_gram[gram].add(record_id)
+
+    def _unindex(self, record_id):
+        key = self._keys.pop(record_id, None)
+        if key is None:
+            return
+        for postings, value in ((self._by_phone, key["phone"]), (self._by_domain, key["domain"]),
+                                (self._by_address, self._address_block(key["address"]))):
+            if value and value in postings:
+                postings[value].discard(record_id)
+        for gram in key["grams"]:
+            self._by_gram[gram].discard(record_id)
+
+    def load(self):
+        rows = self.connection().execute("SELECT id, name, phone, domain, address FROM accounts")
+        with self._lock:
+            for record_id, name, phone, domain, address in rows:
+                self._index(record_id, {"name": name, "phone": phone, "domain": domain, "address": address})
+        logger.info(f"Loaded {len(self._keys)} accounts into the match index")
+
+    def add(self, record_id, record, persist=True):
+        key = self.key_for(record)
+        with self._lock:
+            self._unindex(record_id)
+            self._index(record_id, key)
+        if persist:
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO accounts (id, name, phone, domain, address, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record_id, key["name"], key["phone"], key["domain"], key["address"], time.time())
+                )
+
+    def remove(self, record_id):
+        with self._lock:
+            self._unindex(record_id)
+        with self.connection() as conn:
+            conn.execute("DELETE FROM accounts WHERE id = ?", (record_id,))
+
+    def rename(self, old_id, new_id):
+        # A provisional entry for a row still being created takes the id Zoho assigned
+        with self._lock:
+            key = self._keys.get(old_id)
+            if key is None:
+                return
+            self._unindex(old_id)
+            self._index(new_id, key)
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO accounts (id, name, phone, domain, address, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (new_id, key["name"], key["phone"], key["domain"], key["address"], time.time())
+            )
+
+    def candidates(self, key):
+        # key comes from _prepare()
+        ids = set(self._by_phone.get(key["phone"], ())) | set(self._by_domain.get(key["domain"], ()))
+        block = self._address_block(key["address"])
+        if block:
+            ids |= self._by_address.get(block, set())
+
+        limit = max(MIN_GRAM_POSTINGS, len(self._keys) * MAX_GRAM_SHARE)
+        postings = sorted(
+            (self._by_gram[gram] for gram in key["grams"] if 0 < len(self._by_gram.get(gram, ())) <= limit), key=len
+        )[:MAX_PROBE_GRAMS]
+        shared = Counter()
+        for posting in postings:
+            shared.update(posting)
+        minimum = min(2, len(postings))
+        ids.update(record_id for record_id, count in shared.most_common(self.max_candidates) if count >= minimum)
+        return ids
+
+    def score(self, key, other):
+        # Both keys come from _prepare()
+        total = 0.0
+        compared = set()
+        if key["phone"] and other["phone"]:
+            compared.add("phone")
+            total += FIELD_WEIGHTS["phone"] * (key["phone"] == other["phone"])
+        if key["domain"] and other["domain"]:
+            compared.add("domain")
+            total += FIELD_WEIGHTS["domain"] * (key["domain"] == other["domain"])
+        if key["grams"] and other["grams"]:
+            compared.add("name")
+            grams = key["grams"]
+            total += FIELD_WEIGHTS["name"] * len(grams & other["grams"]) / len(grams | other["grams"])
+        if key["address_tokens"] and other["address_tokens"]:
+            compared.add("address")
+            tokens = key["address_tokens"]
+            total += FIELD_WEIGHTS["address"] * len(tokens & other["address_tokens"]) / len(tokens | other["address_tokens"])
+        # A phone or website identifies a business; otherwise it takes both name and address,
+        # since a name alone is shared by chains and an address by every tenant of a building
+        if not compared & {"phone", "domain"} and not {"name", "address"} <= compared:
+            return 0.0
+        weight = sum(FIELD_WEIGHTS[field] for field in compared)
+        return total / weight
+
+    def match(self, record):
+        key = self.key_for(record)
+        probe = self._prepare(key)
+        with self._lock:
+            best_id, best_score = None, 0.0
+            for record_id in self.candidates(probe):
+                score = self.score(probe, self._keys[record_id])
+                if score > best_score:
+                    best_id, best_score = record_id, score
+            if best_id is None or best_score < self.threshold:
+                return Match(CREATE, score=best_score)
+            indexed = self._keys[best_id]
+
+        # Nothing the row carries differs from what the account already has
+        if all(not value or value == indexed[field] for field, value in key.items()):
+            return Match(SKIP, best_id, best_score)
+        return Match(UPDATE, best_id, best_score)
+
+    def sync(self, client):
+        # Pulls accounts changed since the last sync into the index
+        changed = 0
+        try:
+            for account in client.iter_accounts(modified_since=self.sync_state.if_modified_since()):
+                if not self.sync_state.is_newer(account):
+                    continue
+                self.add(account['id'], account)
+                self.sync_state.advance(account)
+                changed += 1
+        finally:
+            self.sync_state.save()
+        if changed:
+            logger.info(f"Match index picked up {changed} changed accounts ({len(self._keys)} total)")
+        return changed
+
+    def __len__(self):
+        return len(self._keys)
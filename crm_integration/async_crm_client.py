@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import aiohttp
+from crm_integration.token_store import TokenStore
+from crm_integration.transport import IDEMPOTENT_METHODS, RETRY_STATUS_CODES, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Concurrent API calls Zoho allows per org, by edition
+EDITION_CONCURRENCY_LIMITS = {
+    "free": 5,
+    "standard": 10,
+    "professional": 15,
+    "enterprise": 20,
+    "ultimate": 25,
+}
+
+
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+async def read_json(response):
+    # None for a 204 or a body that isn't JSON (a proxy's HTML error page), where response.json() would raise
+    if response.status == 204 or 'json' not in response.content_type:
+        text = await response.text()
+        if text.strip():
+            logger.warning(f"Expected JSON from {response.url}, got {response.content_type}",
+                           extra={"status": response.status, "response": text[:500]})
+        return None
+    try:
+        return await response.json()
+    except ValueError as e:
+        logger.warning(f"Malformed JSON from {response.url}: {e}", extra={"status": response.status})
+        return None
+
+
+class AsyncZohoCRMClient:
+    # The config is read in open(), off the event loop, so a client can be created inside a coroutine
+    def __init__(self, config_path='config.json', edition=None, max_concurrency=None,
+                 max_retries=5, backoff_base=0.5, backoff_cap=30, timeout=60):
+        self.config_path = config_path
+        self.token_store = TokenStore(config_path)
+        self.config = None
+        self.base_url = None
+        self.accounts_url = None
+        self.edition = edition
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+        self.session = None
+        self._semaphore = None
+        self._token_lock = None
+        self._token_generation = 0
+
+    async def open(self):
+        if self.config is None:
+            self.config = await asyncio.to_thread(self.token_store.read)
+            self.base_url = f"{self.config['api_domain']}/crm/v2"
+            self.accounts_url = self.config.get('accounts_url', 'https://accounts.zoho.com')
+            edition = self.edition or self.config.get('edition', 'standard')
+            self.max_concurrency = self.max_concurrency or EDITION_CONCURRENCY_LIMITS.get(edition.lower(), 10)
+        if self.session is None:
+            # Locks and the session must be created inside the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._token_lock = asyncio.Lock()
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def refresh_access_token(self, seen_generation=None):
+        async with self._token_lock:
+            if seen_generation is not None and seen_generation != self._token_generation:
+                return True
+            # Another process serving this org refreshed first; its token is still good
+            stored = await asyncio.to_thread(self.token_store.read)
+            if stored.get('access_token') and stored['access_token'] != self.config['access_token']:
+                self.config['access_token'] = stored['access_token']
+                self._token_generation += 1
+                return True
+
+            params = {
+                "refresh_token": self.config['refresh_token'],
+                "client_id": self.config['client_id'],
+                "client_secret": self.config['client_secret'],
+                "grant_type": "refresh_token"
+            }
+            async with self.session.post(f"{self.accounts_url}/oauth/v2/token", params=params) as response:
+                new_tokens = await read_json(response)
+            if response.status != 200 or 'access_token' not in (new_tokens or {}):
+                logger.warning("Failed to refresh access token", extra={"response": new_tokens})
+                return False
+
+            self.config['access_token'] = new_tokens['access_token']
+            self._token_generation += 1
+            # Written under the store's file lock, and only the token, so other keys in the file survive
+            await asyncio.to_thread(self.token_store.update, access_token=new_tokens['access_token'])
+            return True
+
+    async def _request(self, method, path, headers=None, form_factory=None, **kwargs):
+        # path is relative to the CRM API root, which is only known once open() has read the config
+        await self.open()
+        url = f"{self.base_url}{path}"
+        refreshed = False
+        attempt = 0
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        while True:
+            headers = dict(headers or {})
+            headers["Authorization"] = f"Zoho-oauthtoken {self.config['access_token']}"
+            generation = self._token_generation
+            if form_factory:
+                # Multipart bodies are consumed on send, so each attempt builds a new one
+                kwargs['data'] = form_factory()
+
+            try:
+                async with self._semaphore:
+                    async with self.session.request(method, url, headers=headers, **kwargs) as response:
+                        status = response.status
+                        response_headers = response.headers
+                        body = await read_json(response)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # Only a failed connect is known not to have reached Zoho
+                if attempt >= self.max_retries or not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                logger.warning(f"{method} {url} failed ({e}), retrying")
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_cap))
+                attempt += 1
+                continue
+
+            if status == 401 and not refreshed:
+                refreshed = True
+                if await self.refresh_access_token(seen_generation=generation):
+                    continue
+
+            if status in RETRY_STATUS_CODES and (idempotent or status == 429) and attempt < self.max_retries:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, response_headers)
+                logger.warning(f"{method} {url} returned {status}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            return status, body
+
+    async def get_account_details(self, record_id):
+        status, body = await self._request('GET', f"/Accounts/{record_id}")
+        if status == 200 and body:
+            return body['data'][0]
+        logger.warning("Failed to fetch account details. Status code: %s", status, extra={"response": body})
+        return None
+
+    async def create_account(self, data):
+        status, body = await self._request('POST', "/Accounts", json=data)
+        if status == 201 and body:
+            return body['data'][0]["details"]['id']
+        logger.warning("Failed to add data. Status code: %s", status, extra={"response": body})
+        return None
+
+    async def update_account(self, record_id, data):
+        update_data = {
+            "data": [
+                {
+                    "Account_Name": data['Name'],
+                    "Website": data['Website'],
+                    "Number": data['Phone'],
+                    "Address": data['Address']
+                }
+            ]
+        }
+        status, body = await self._request('PUT', f"/Accounts/{record_id}", json=update_data)
+        if status == 200:
+            return True
+        logger.warning(f"Failed to update account {record_id}. Status code: {status}", extra={"response": body})
+        return False
+
+    async def upload_photo(self, module_name, record_id, image_path):
+        if not image_path or not os.path.exists(image_path):
+            return False
+
+        content = await asyncio.to_thread(read_file, image_path)
+
+        def build_form():
+            form = aiohttp.FormData()
+            form.add_field('file', content, filename=os.path.basename(image_path))
+            return form
+
+        status, body = await self._request('POST', f"/{module_name}/{record_id}/photo", form_factory=build_form)
+        if status == 200:
+            return True
+        logger.warning(f"Failed to upload photo. Status code: {status}", extra={"response": body})
+        return False
+
+    async def get_field_metadata(self, module_name='Accounts'):
+        status, body = await self._request('GET', "/settings/fields", params={"module": module_name})
+        if status == 200 and body:
+            return body['fields']
+        logger.warning("Failed to fetch fields", extra={"response": body})
+        return None
+
+    async def gather(self, coroutines):
+        # The semaphore bounds calls in flight, so any number of coroutines can be queued here
+        return await asyncio.gather(*coroutines, return_exceptions=True)
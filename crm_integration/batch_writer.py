@@ -0,0 +1,133 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 100
+
+# Record-level errors that will fail the same way on every retry
+NON_RETRYABLE_CODES = {
+    "INVALID_DATA",
+    "MANDATORY_NOT_FOUND",
+    "DUPLICATE_DATA",
+    "INVALID_MODULE",
+    "NO_PERMISSION",
+    "LIMIT_EXCEEDED",
+}
+
+# Operations Zoho can safely be sent again after a request that failed as a whole;
+# a failed create may still have created the records
+RESENDABLE_OPERATIONS = {"update", "upsert"}
+
+
+class AccountBatchWriter:
+    def __init__(self, client, batch_size=MAX_BATCH_SIZE, duplicate_check_fields=None,
+                 max_retries=2, on_result=None):
+        self.client = client
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.duplicate_check_fields = duplicate_check_fields
+        self.max_retries = max_retries
+        self.on_result = on_result
+        self.pending = {"create": [], "update": [], "upsert": []}
+
+    def add(self, record, key=None, operation='upsert'):
+        if operation == 'update' and 'id' not in record:
+            raise ValueError("Updates need the record 'id' in the payload")
+
+        # Records with unknown or read-only fields fail locally instead of costing an API call
+        errors = self.client.validate_record(record)
+        if errors:
+            result = {
+                "key": key,
+                "record": record,
+                "operation": operation,
+                "status": "error",
+                "code": "INVALID_FIELD",
+                "action": None,
+                "message": '; '.join(errors),
+                "id": None,
+            }
+            if self.on_result:
+                self.on_result(result)
+            return [result]
+
+        self.pending[operation].append((key, record))
+        if len(self.pending[operation]) >= self.batch_size:
+            return self.flush(operation)
+        return []
+
+    def create(self, record, key=None):
+        return self.add(record, key, 'create')
+
+    def update(self, record, key=None):
+        return self.add(record, key, 'update')
+
+    def upsert(self, record, key=None):
+        return self.add(record, key, 'upsert')
+
+    def flush(self, operation=None):
+        operations = [operation] if operation else list(self.pending)
+        results = []
+        for op in operations:
+            items, self.pending[op] = self.pending[op], []
+            for start in range(0, len(items), self.batch_size):
+                results.extend(self._write_batch(op, items[start:start + self.batch_size]))
+        return results
+
+    def _send(self, operation, records):
+        if operation == 'create':
+            return self.client.create_accounts(records)
+        if operation == 'update':
+            return self.client.update_accounts(records)
+        return self.client.upsert_accounts(records, self.duplicate_check_fields)
+
+    def _write_batch(self, operation, items):
+        results = []
+        attempt = 0
+        while items:
+            response = self._send(operation, [record for _, record in items])
+            retry = []
+            non_retryable = NON_RETRYABLE_CODES if operation in RESENDABLE_OPERATIONS \
+                else NON_RETRYABLE_CODES | {"REQUEST_FAILED"}
+
+            for index, (key, record) in enumerate(items):
+                # Zoho answers with one entry per input record, in input order
+                if response is None or index >= len(response):
+                    outcome = {"status": "error", "code": "REQUEST_FAILED", "message": "No response for record"}
+                else:
+                    outcome = response[index]
+
+                result = {
+                    "key": key,
+                    "record": record,
+                    "operation": operation,
+                    "status": outcome.get('status'),
+                    "code": outcome.get('code'),
+                    "action": outcome.get('action'),
+                    "message": outcome.get('message'),
+                    "id": (outcome.get('details') or {}).get('id'),
+                }
+
+                if result["status"] != 'success' and result["code"] not in non_retryable \
+                        and attempt < self.max_retries:
+                    retry.append((key, record))
+                    continue
+
+                results.append(result)
+                if self.on_result:
+                    self.on_result(result)
+
+            if retry:
+                logger.info(f"Retrying {len(retry)} of {len(items)} {operation} records")
+            items = retry
+            attempt += 1
+
+        succeeded = sum(1 for result in results if result["status"] == 'success')
+        logger.info(f"Batch {operation}: {succeeded}/{len(results)} records succeeded")
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,223 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from crm_integration.multipart import MultipartFileStream
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Columns Zoho appends to each row of a Bulk Write result file
+RESULT_STATUS = 'STATUS'
+RESULT_RECORD_ID = 'RECORD_ID'
+RESULT_ERRORS = 'ERRORS'
+
+
+class ZohoBulkClient:
+    def __init__(self, client, poll_interval=5, job_timeout=3600, work_dir=None):
+        self.client = client
+        self.transport = client.transport
+        config = client.config
+        # Both URLs are configurable so a local stub server can stand in for Zoho
+        self.bulk_url = config.get('bulk_url', f"{config['api_domain']}/crm/bulk/v2")
+        self.upload_url = config.get('bulk_upload_url', 'https://content.zohoapis.com/crm/v2/upload')
+        # Bulk results are served from Zoho's download host, not api_domain; relative result paths resolve against it
+        self.download_url = config.get('bulk_download_url', 'https://download-accl.zoho.com')
+        self.org_id = config.get('org_id')
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.work_dir = work_dir
+
+    def _json(self, response, action):
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"Bulk {action} failed. Status code: {response.status_code} {response.text}")
+        return response.json()
+
+    def _wait(self, url, state_key, done_states):
+        deadline = time.time() + self.job_timeout
+        while True:
+            job = self._json(self.transport.get(url), 'job status')['data'][0]
+            state = job.get(state_key)
+            if state in done_states:
+                return job
+            if time.time() > deadline:
+                raise TimeoutError(f"Bulk job {url} still {state} after {self.job_timeout}s")
+            time.sleep(self.poll_interval)
+
+    def _download(self, url):
+        # Results are zip files; spool them to disk instead of holding them in memory
+        fd, path = tempfile.mkstemp(suffix='.zip', dir=self.work_dir)
+        with os.fdopen(fd, 'wb') as zip_file:
+            response = self.transport.get(url, stream=True)
+            if response.status_code != 200:
+                response.close()
+                os.remove(path)
+                raise RuntimeError(f"Failed to download {url}. Status code: {response.status_code}")
+            with response:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    zip_file.write(chunk)
+        return path
+
+    def _iter_zip_csv(self, zip_path):
+        with zipfile.ZipFile(zip_path) as archive:
+            for name in archive.namelist():
+                if not name.lower().endswith('.csv'):
+                    continue
+                with archive.open(name) as member:
+                    yield from csv.DictReader(io.TextIOWrapper(member, encoding='utf-8-sig', newline=''))
+
+    # Bulk Read
+
+    def create_read_job(self, module='Accounts', fields=None, page=1, criteria=None):
+        query = {"module": module, "page": page}
+        if fields:
+            query["fields"] = fields
+        if criteria:
+            query["criteria"] = criteria
+        response = self.transport.post(f"{self.bulk_url}/read", json={"query": query})
+        return self._json(response, 'read')['data'][0]['details']['id']
+
+    def iter_read(self, module='Accounts', fields=None, criteria=None):
+        # Streams every record of the module, one CSV row at a time, across result pages
+        page = 1
+        while True:
+            job_id = self.create_read_job(module, fields, page, criteria)
+            logger.info(f"Bulk read job {job_id} submitted for {module} page {page}")
+            job = self._wait(f"{self.bulk_url}/read/{job_id}", 'state', ('COMPLETED', 'FAILURE'))
+            if job['state'] != 'COMPLETED':
+                raise RuntimeError(f"Bulk read job {job_id} failed: {job}")
+
+            zip_path = self._download(f"{self.bulk_url}/read/{job_id}/result")
+            try:
+                yield from self._iter_zip_csv(zip_path)
+            finally:
+                os.remove(zip_path)
+
+            if not job.get('result', {}).get('more_records'):
+                return
+            page += 1
+
+    # Bulk Write
+
+    def build_write_file(self, records, field_names):
+        fd, path = tempfile.mkstemp(suffix='.zip', dir=self.work_dir)
+        os.close(fd)
+        count = 0
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open('records.csv', 'w') as member:
+                text = io.TextIOWrapper(member, encoding='utf-8', newline='')
+                writer = csv.writer(text)
+                writer.writerow(field_names)
+                for record in records:
+                    writer.writerow([record.get(name, '') for name in field_names])
+                    count += 1
+                text.flush()
+                text.detach()
+        return path, count
+
+    def upload_write_file(self, zip_path):
+        headers = {"feature": "bulk-write"}
+        if self.org_id:
+            headers["X-CRM-ORG"] = str(self.org_id)
+        with MultipartFileStream('file', zip_path, 'application/zip') as body:
+            headers["Content-Type"] = body.content_type
+            response = self.transport.post(self.upload_url, headers=headers, data=body)
+        return self._json(response, 'upload')['details']['file_id']
+
+    def create_write_job(self, file_id, field_names, module='Accounts', operation='update', find_by='id'):
+        resource = {
+            "type": "data",
+            "module": module,
+            "file_id": file_id,
+            "field_mappings": [{"api_name": name, "index": index} for index, name in enumerate(field_names)],
+        }
+        if operation != 'insert':
+            resource["find_by"] = find_by
+        payload = {"operation": operation, "ignore_empty": True, "resource": [resource]}
+        response = self.transport.post(f"{self.bulk_url}/write", json=payload)
+        return self._json(response, 'write')['details']['id']
+
+    def write(self, records, field_names, keys=None, module='Accounts', operation='update', find_by='id'):
+        # Returns one result per input record: {"key", "status", "id", "errors"}
+        records = list(records)
+        keys = list(keys) if keys is not None else list(range(len(records)))
+        zip_path, count = self.build_write_file(records, field_names)
+        try:
+            file_id = self.upload_write_file(zip_path)
+        finally:
+            os.remove(zip_path)
+
+        job_id = self.create_write_job(file_id, field_names, module, operation, find_by)
+        logger.info(f"Bulk write job {job_id} submitted with {count} {module} records")
+        job = self._wait_write(job_id)
+        return self.reconcile(job, keys)
+
+    def _wait_write(self, job_id):
+        deadline = time.time() + self.job_timeout
+        while True:
+            job = self._json(self.transport.get(f"{self.bulk_url}/write/{job_id}"), 'job status')
+            if job.get('status') in ('COMPLETED', 'FAILED'):
+                return job
+            if time.time() > deadline:
+                raise TimeoutError(f"Bulk write job {job_id} still {job.get('status')} after {self.job_timeout}s")
+            time.sleep(self.poll_interval)
+
+    def reconcile(self, job, keys):
+        if job.get('status') != 'COMPLETED':
+            raise RuntimeError(f"Bulk write job failed: {job}")
+
+        download_url = job['result']['download_url']
+        if download_url.startswith('/'):
+            download_url = f"{self.download_url.rstrip('/')}{download_url}"
+        zip_path = self._download(download_url)
+
+        results = []
+        try:
+            # Result rows come back in the order the records were uploaded
+            for key, row in zip(keys, self._iter_zip_csv(zip_path)):
+                status = (row.get(RESULT_STATUS) or '').upper()
+                results.append({
+                    "key": key,
+                    "status": 'success' if status in ('ADDED', 'UPDATED') else 'error',
+                    "action": status.lower(),
+                    "id": row.get(RESULT_RECORD_ID) or None,
+                    "errors": row.get(RESULT_ERRORS) or None,
+                })
+        finally:
+            os.remove(zip_path)
+
+        succeeded = sum(1 for result in results if result["status"] == 'success')
+        logger.info(f"Bulk write reconciled: {succeeded}/{len(keys)} records succeeded")
+        for key in keys[len(results):]:
+            results.append({"key": key, "status": 'error', "action": None, "id": None,
+                            "errors": 'Missing from the job result file'})
+        return results
+
+    def write_businesses(self, items):
+        # items: (record_id, business) pairs from the scraper; images still go through the API
+        items = list(items)
+        field_names = ['id', 'Account_Name', 'Website', 'Number', 'Address']
+        records = [
+            {
+                "id": record_id,
+                "Account_Name": business['Name'],
+                "Website": business['Website'],
+                "Number": business['Phone'],
+                "Address": business['Address']
+            }
+            for record_id, business in items
+        ]
+        results = self.write(records, field_names, keys=[record_id for record_id, _ in items])
+
+        businesses = dict(items)
+        for result in results:
+            if result["status"] == 'success':
+                business = businesses[result["key"]]
+                self.client.sync_images(result["key"], self.client.image_paths_for(business))
+            else:
+                logger.warning(f"Bulk write failed for account {result['key']}: {result['errors']}")
+        return results
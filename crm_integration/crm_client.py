@@ -1,76 +1,184 @@
-import requests
-import pandas as pd
+import atexit
+import logging
 import json
 import time
 import os
-import csv
 import base64
-from data_scraper.scrapper import BusinessScraper
-from base.webdriver_base import WebDriverBase
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from data_scraper.normalize import normalize_address
+from data_scraper.address_store import ProcessedAddressStore
+from data_scraper.image_downloader import ImageDownloader
+from base.metrics import IMAGE_UPLOAD_SECONDS
+from base.rate_limit import DomainRateLimiter, TokenBucket
+from crm_integration.account_index import SKIP, UPDATE, AccountIndex
+from crm_integration.sync_state import SyncState, parse_zoho_time
+from crm_integration.batch_writer import AccountBatchWriter
+from crm_integration.transport import ZohoTransport
+from crm_integration.multipart import MultipartFileStream
+from crm_integration.csv_ingester import CsvTailIngester
+from crm_integration.metadata_registry import FieldMetadataRegistry
+from crm_integration.token_store import TokenStore
 
-class ZohoCRMClient(WebDriverBase):
-    def __init__(self, config_path='config.json'):
-        # super().__init__()
+logger = logging.getLogger(__name__)
+
+# Zoho v2 only serves the first 2000 records of a listing through page/per_page
+MAX_LISTING_RECORDS = 2000
+
+DEFAULT_IMAGE_FIELDS = ['Image_Upload_1', 'Image_Upload_2', 'Image_Upload_3']
+
+
+def match_fields(row):
+    # The CSV columns that identify a business, under the Accounts field names the index reads
+    return {"Account_Name": row['Name'], "Number": row['Phone'], "Website": row['Website'], "Address": row['Address']}
+
+
+class ZohoCRMClient:
+    def __init__(self, config_path='config.json', state_path='sync_state.json', data_dir=None, rate_limiter=None):
+        # data_dir keeps one org's sync state, address store and caches apart from every other org's
+        self.config_path = config_path
+        self.token_store = TokenStore(config_path)
         self.config = self.load_config(config_path)
+        self.data_dir = data_dir
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            state_path = os.path.join(data_dir, os.path.basename(state_path))
         self.base_url = f"{self.config['api_domain']}/crm/v2"
-        self.headers = {
-            "Authorization": f"Zoho-oauthtoken {self.config['access_token']}"
-        }
-        self.scraper = BusinessScraper()
+        # Image upload fields are only writable through v2.1 and later
+        self.files_base_url = f"{self.config['api_domain']}/crm/v2.1"
+        if rate_limiter is None and self.config.get('requests_per_minute'):
+            rate_limiter = TokenBucket.per_minute(self.config['requests_per_minute'], self.config.get('request_burst'))
+        self.transport = ZohoTransport(
+            self.config,
+            pool_size=self.config.get('http_pool_size', 10),
+            token_store=self.token_store,
+            rate_limiter=rate_limiter
+        )
+        self.sync_state = SyncState(state_path)
+        self.duplicate_check_fields = self.config.get('duplicate_check_fields', ['Account_Name'])
+        self._default_layout_id = None
+        self.metadata = FieldMetadataRegistry(
+            self.transport, self.base_url, cache_dir=self.data_path('metadata_cache'),
+            ttl=self.config.get('metadata_ttl', 24 * 3600)
+        )
+        # 'api' uploads images through the Files API; 'browser' drives the CRM web UI
+        self.image_sync = self.config.get('image_sync', 'api')
+        if data_dir:
+            self.address_store = ProcessedAddressStore(self.data_path('processed_addresses.db'), legacy_csv=None)
+            self.image_downloader = ImageDownloader(root=self.data_path('images'))
+        else:
+            self.address_store = ProcessedAddressStore()
+            self.image_downloader = ImageDownloader()
+        # The stripped-down browser can't drive the CRM UI, so it's only the default with API image sync
+        self.fast_scrape = self.config.get('fast_scrape', self.image_sync == 'api')
+        self.search_url = self.config.get('search_url')
+        # Requests per minute to each host the scraper loads pages from; 0 turns the limit off
+        self.scrape_rate_limiter = DomainRateLimiter(
+            per_minute=self.config.get('scrape_requests_per_minute', 30), burst=self.config.get('scrape_burst'),
+            rates=self.config.get('scrape_rate_limits')
+        )
+        self._scraper = None
+        self._scraper_lock = threading.Lock()
+        # One WebDriver behind self.scraper, so browser image syncs from the write workers take turns
+        self._browser_lock = threading.Lock()
+        self._image_fields = self.config.get('image_upload_fields')
+        self.image_upload_workers = self.config.get('image_upload_workers', 3)
+
+    @property
+    def scraper(self):
+        # Chrome only starts the first time something actually needs the browser
+        with self._scraper_lock:
+            if self._scraper is None:
+                from data_scraper.scrapper import BusinessScraper
+                self._scraper = BusinessScraper(
+                    fast=self.fast_scrape, search_url=self.search_url, rate_limiter=self.scrape_rate_limiter,
+                    image_downloader=self.image_downloader
+                )
+                atexit.register(self.close_scraper)
+            return self._scraper
+
+    def close_scraper(self):
+        with self._scraper_lock:
+            scraper, self._scraper = self._scraper, None
+        if scraper is not None:
+            scraper.quit()
+
+    def close(self):
+        self.close_scraper()
+        self.image_downloader.close()
+        self.transport.close()
+
+    def data_path(self, name):
+        return os.path.join(self.data_dir, name) if self.data_dir else name
 
     def load_config(self, config_path):
         with open(config_path, 'r') as config_file:
             return json.load(config_file)
 
     def refresh_access_token(self):
-        url = "https://accounts.zoho.com/oauth/v2/token"
-        params = {
-            "refresh_token": self.config['refresh_token'],
-            "client_id": self.config['client_id'],
-            "client_secret": self.config['client_secret'],
-            "grant_type": "refresh_token"
-        }
-        response = requests.post(url, params=params)
-        if response.status_code == 200:
-            new_tokens = response.json()
-            self.update_access_token(new_tokens['access_token'])
-        else:
-            print("Failed to refresh access token:", response.json())
+        return self.transport.refresh_access_token()
 
     def update_access_token(self, new_access_token):
         self.config['access_token'] = new_access_token
-        self.headers["Authorization"] = f"Zoho-oauthtoken {new_access_token}"
-        with open('config.json', 'w') as config_file:
-            json.dump(self.config, config_file)
-            
+        self.token_store.update(access_token=new_access_token)
+
     def get_account_id(self, record_id):
         url = f"{self.base_url}/Accounts/{record_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.transport.get(url)
         if response.status_code == 200:
             return response.json()['data'][0]["details"]['id']
         else:
             return None
 
+    def validate_record(self, record):
+        errors = self.metadata.validate(record, 'Accounts')
+        if errors:
+            logger.warning(f"Rejected Accounts payload before sending: {'; '.join(errors)}")
+        return errors
+
     def create_account(self, data):
         url = f"{self.base_url}/Accounts"
         # Add content type header for file upload
-        headers = self.headers.copy()
-        headers["Content-Type"] = "application/json"
-        
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 401:
-            self.refresh_access_token()
-            headers["Authorization"] = self.headers["Authorization"]
-            response = requests.post(url, headers=headers, json=data)
+        headers = {"Content-Type": "application/json"}
+        if any(self.validate_record(record) for record in data['data']):
+            return None
+
+        response = self.transport.post(url, headers=headers, json=data)
 
         if response.status_code == 201:
-            print("Data added successfully!")
+            logger.info("Data added successfully!")
             return response.json()['data'][0]["details"]['id']
         else:
-            print("Failed to add data. Status code:", response.status_code)
-            print("Response:", response.json())
+            logger.warning("Failed to add data. Status code: %s", response.status_code,
+                           extra={"response": response.json()})
             return None
 
+    def _write_records(self, method, url, payload, idempotent=None):
+        headers = {"Content-Type": "application/json"}
+
+        response = self.transport.request(method, url, headers=headers, json=payload, idempotent=idempotent)
+
+        # 200/201/202 and 207 (multi-status) all carry one result per record
+        if response.status_code in (200, 201, 202, 207):
+            return response.json().get('data', [])
+        logger.warning(f"Failed to {method} {len(payload['data'])} records. Status code: {response.status_code}",
+                       extra={"response": response.text})
+        return None
+
+    def create_accounts(self, records):
+        return self._write_records('POST', f"{self.base_url}/Accounts", {"data": records})
+
+    def update_accounts(self, records):
+        return self._write_records('PUT', f"{self.base_url}/Accounts", {"data": records})
+
+    def upsert_accounts(self, records, duplicate_check_fields=None):
+        payload = {"data": records}
+        if duplicate_check_fields:
+            payload["duplicate_check_fields"] = duplicate_check_fields
+        # Resending an upsert matches the records the first attempt created instead of duplicating them
+        return self._write_records('POST', f"{self.base_url}/Accounts/upsert", payload, idempotent=True)
+
     def encode_image_to_base64(self, image_path):
         if not image_path or image_path.strip() == '':
             return None
@@ -89,7 +197,7 @@ class ZohoCRMClient(WebDriverBase):
                 base64_data = base64.b64encode(image_file.read()).decode("utf-8")
                 return f"data:{mime_type};base64,{base64_data}"
         else:
-            print(f"Warning: File {image_path} not found. Skipping this file.")
+            logger.warning(f"File {image_path} not found. Skipping this file.")
             return None
 
     def upload_photo(self, module_name, record_id, image_path):
@@ -97,36 +205,87 @@ class ZohoCRMClient(WebDriverBase):
             return False
             
         url = f"{self.base_url}/{module_name}/{record_id}/photo"
-        headers = self.headers.copy()
-        # Remove Content-Type as it will be set automatically for multipart/form-data
-        if "Content-Type" in headers:
-            del headers["Content-Type"]
-            
         try:
             with open(image_path, 'rb') as image_file:
                 files = {'file': (os.path.basename(image_path), image_file)}
-                response = requests.post(url, headers=headers, files=files)
-                
-                if response.status_code == 401:
-                    self.refresh_access_token()
-                    headers["Authorization"] = self.headers["Authorization"]
-                    response = requests.post(url, headers=headers, files=files)
-                
+                response = self.transport.post(url, files=files)
+
                 if response.status_code == 200:
-                    print(f"Photo uploaded successfully for record {record_id}")
+                    logger.info(f"Photo uploaded successfully for record {record_id}")
                     return True
                 else:
-                    print(f"Failed to upload photo. Status code: {response.status_code}")
-                    print("Response:", response.json())
+                    logger.warning(f"Failed to upload photo. Status code: {response.status_code}",
+                                   extra={"response": response.json()})
                     return False
         except Exception as e:
-            print(f"Error uploading photo: {str(e)}")
+            logger.warning(f"Error uploading photo: {str(e)}")
             return False
 
+    def upload_file(self, file_path):
+        url = f"{self.files_base_url}/files"
+        with MultipartFileStream('file', file_path) as body:
+            response = self.transport.post(url, headers={"Content-Type": body.content_type}, data=body)
+
+        if response.status_code == 200:
+            return response.json()['data'][0]['details']['id']
+        logger.warning(f"Failed to upload {file_path}. Status code: {response.status_code}",
+                       extra={"response": response.text})
+        return None
+
+    @property
+    def image_fields(self):
+        if self._image_fields is None:
+            metadata = self.metadata.module('Accounts')
+            fields = self.metadata.image_upload_fields('Accounts') if metadata else []
+            self._image_fields = [field['api_name'] for field in fields] or DEFAULT_IMAGE_FIELDS
+        return self._image_fields
+
+    def upload_images_via_api(self, record_id, image_paths):
+        # Upload every file concurrently, then attach them all to the record in one update
+        slots = [
+            (field_name, image_path)
+            for field_name, image_path in zip(self.image_fields, image_paths)
+            if image_path and os.path.exists(image_path)
+        ]
+        if not slots:
+            return True
+
+        with ThreadPoolExecutor(max_workers=self.image_upload_workers) as executor:
+            file_ids = list(executor.map(self.upload_file, [image_path for _, image_path in slots]))
+
+        record = {
+            field_name: [{"Encrypted_Id": file_id}]
+            for (field_name, _), file_id in zip(slots, file_ids) if file_id
+        }
+        if not record:
+            return False
+
+        url = f"{self.files_base_url}/Accounts/{record_id}"
+        headers = {"Content-Type": "application/json"}
+        response = self.transport.put(url, headers=headers, json={"data": [record]})
+
+        if response.status_code == 200:
+            logger.info(f"Uploaded {len(record)} images to account {record_id}")
+            return len(record) == len(slots)
+        logger.warning(f"Failed to attach images to account {record_id}. Status code: {response.status_code}",
+                       extra={"response": response.text})
+        return False
+
+    def sync_images(self, record_id, image_paths, layout_id=None):
+        if self.image_sync == 'browser':
+            layout_id = layout_id or self.get_default_layout_id(record_id)
+            with self._browser_lock:
+                self.scraper.update_images_in_zoho(
+                    record_id, layout_id, image_paths,
+                    org_id=self.config.get('org_id'), crm_url=self.config.get('crm_web_url')
+                )
+            return True
+        with IMAGE_UPLOAD_SECONDS.time(method='api'):
+            return self.upload_images_via_api(record_id, image_paths)
+
     def update_account_images(self, record_id, field_name, image_data):
         url = f"{self.base_url}/Accounts/{record_id}"
-        headers = self.headers.copy()
-        headers["Content-Type"] = "application/json"
+        headers = {"Content-Type": "application/json"}
 
         update_data = {
             "data": [
@@ -136,118 +295,175 @@ class ZohoCRMClient(WebDriverBase):
             ]
         }
 
-        response = requests.put(url, headers=headers, json=update_data)
-        if response.status_code == 401:
-            self.refresh_access_token()
-            headers["Authorization"] = self.headers["Authorization"]
-            response = requests.put(url, headers=headers, json=update_data)
+        response = self.transport.put(url, headers=headers, json=update_data)
 
         if response.status_code == 200:
-            print(f"Images for account {record_id} updated successfully!")
+            logger.info(f"Images for account {record_id} updated successfully!")
         else:
-            print(f"Failed to update images for account {record_id}. Status code:", response.status_code)
-            print("Response:", response.json())
+            logger.warning(f"Failed to update images for account {record_id}. Status code: {response.status_code}",
+                           extra={"response": response.json()})
 
-    def monitor_csv_and_update_crm(self, csv_file_path):
+    def account_index(self):
+        return AccountIndex(
+            self.data_path('account_index.db'), phone_region=self.config.get('phone_region', 'US'),
+            threshold=self.config.get('match_threshold', 0.75)
+        )
+
+    def monitor_csv_and_update_crm(self, csv_file_path, poll_interval=10):
+        # With dedupe on, rows are matched against a local index of existing accounts and routed to
+        # update, skip or create; without it every row is upserted on the duplicate check fields
+        index = self.account_index() if self.config.get('dedupe', True) else None
+        created = 0
+
+        def on_result(result):
+            row = result["key"]
+            if result["status"] != 'success':
+                logger.warning(f"Failed to write {row['Name']}: {result['code']} {result['message']}")
+                if index is not None and row.get('Pending_Id'):
+                    index.remove(row['Pending_Id'])
+                return
+            if index is not None:
+                if row.get('Pending_Id'):
+                    index.rename(row['Pending_Id'], result["id"])
+                else:
+                    index.add(result["id"], match_fields(row))
+            self.sync_images(result["id"], self.image_paths_for(row))
+
+        ingester = CsvTailIngester(csv_file_path)
         while True:
-            with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
-                csvreader = csv.DictReader(csvfile)
-                for row in csvreader:
-                    data = {
-                        "data": [
-                            {
-                                "Account_Name": row['Name'],
-                                "Website": row['Website'],
-                                "Number": row['Phone'],
-                                "Billing_Street": 'Billing_Street',
-                                "Billing_City": 'Billing_City',
-                                "Billing_State": 'Billing_State',
-                                "Billing_Code": 'Billing_Code',
-                                "Billing_Country": 'Billing_Country',
-                                "Images": row['Images'],
-                                "Address": row['Address']
-                            }
-                        ]
+            if index is not None:
+                index.sync(self)
+            # Only rows appended since the last committed batch are read; a batch replayed after a
+            # crash matches the accounts it already created, or is upserted on the duplicate check fields
+            for rows, position in ingester.iter_batches(batch_size=100):
+                writer = AccountBatchWriter(self, duplicate_check_fields=self.duplicate_check_fields,
+                                            on_result=on_result)
+                for row in rows:
+                    record = {
+                        "Account_Name": row['Name'],
+                        "Website": row['Website'],
+                        "Number": row['Phone'],
+                        "Billing_Street": 'Billing_Street',
+                        "Billing_City": 'Billing_City',
+                        "Billing_State": 'Billing_State',
+                        "Billing_Code": 'Billing_Code',
+                        "Billing_Country": 'Billing_Country',
+                        "Images": row['Images'],
+                        "Address": row['Address']
                     }
-                    record_id = self.create_account(data)
-                    account_details = self.get_account_details(record_id)
-                    print(account_details)
-
-                    layout_id = account_details['$layout_id']['id']
-                    business_name = row['Name'].replace(" ", "_")
-                    image_paths = [
-                        f'images/{business_name}/image_{i}.jpg' for i in range(3)
-                    ]
-
-                    self.scraper.update_images_in_zoho(record_id, layout_id, image_paths)
-            time.sleep(10)
-
-    def get_field_metadata(self):
-        url = f"{self.base_url}/settings/fields?module=Accounts"
-        response = requests.get(url, headers=self.headers)
-        
-        if response.status_code == 401:
-            self.refresh_access_token()
-            response = requests.get(url, headers=self.headers)
-        
-        if response.status_code == 200:
-            fields = response.json()['fields']
-            for field in fields:
-                print(f"Field Name: {field['field_label']}")
-                print(f"API Name: {field['api_name']}")
-                print("---")
-        else:
-            print("Failed to fetch fields:", response.json())
+                    if index is None:
+                        writer.upsert(record, key=row)
+                        continue
+
+                    match = index.match(match_fields(row))
+                    if match.action == SKIP:
+                        logger.debug(f"Skipping {row['Name']}, already in account {match.record_id}")
+                    elif match.action == UPDATE:
+                        writer.update(dict(record, id=match.record_id), key=row)
+                    else:
+                        # Indexed before it exists, so a repeat of the row later in the file isn't created twice
+                        created += 1
+                        pending_id = f"pending:{created}"
+                        index.add(pending_id, match_fields(row), persist=False)
+                        writer.create(record, key=dict(row, Pending_Id=pending_id))
+                writer.flush()
+                ingester.commit(position)
+            time.sleep(poll_interval)
+
+    def image_paths_for(self, data):
+        if data.get('Image_Paths'):
+            return data['Image_Paths']
+        return self.image_downloader.paths_for(normalize_address(data.get('Address')))
 
-    def get_account_details(self, record_id):
+    def get_default_layout_id(self, record_id=None):
+        # Records written without an explicit layout all land on the module's default one
+        if self._default_layout_id is None:
+            self._default_layout_id = self.metadata.default_layout_id('Accounts')
+        if self._default_layout_id is None and record_id:
+            account_details = self.get_account_details(record_id)
+            if account_details:
+                self._default_layout_id = account_details['$layout_id']['id']
+        return self._default_layout_id
+
+    def get_field_metadata(self, module='Accounts'):
+        metadata = self.metadata.module(module)
+        if metadata is None:
+            logger.warning("Failed to fetch fields")
+            return None
+
+        for field in metadata.fields:
+            print(f"Field Name: {field['field_label']}")
+            print(f"API Name: {field['api_name']}")
+            print("---")
+        return metadata.fields
+
+    def get_account_details(self, record_id, verbose=False):
         url = f"{self.base_url}/Accounts/{record_id}"
-        response = requests.get(url, headers=self.headers)
-        
-        if response.status_code == 401:
-            self.refresh_access_token()
-            response = requests.get(url, headers=self.headers)
-        
+        response = self.transport.get(url)
+
         if response.status_code == 200:
             account_data = response.json()['data'][0]
-            print("Account Details:")
-            print(json.dumps(account_data, indent=4))
+            if verbose:
+                print("Account Details:")
+                print(json.dumps(account_data, indent=4))
             return account_data
         else:
-            print("Failed to fetch account details. Status code:", response.status_code)
-            print("Response:", response.json())
+            logger.warning("Failed to fetch account details. Status code: %s", response.status_code,
+                           extra={"response": response.json()})
             return None
 
-    def fetch_and_process_accounts(self):
+    def iter_accounts(self, modified_since=None, per_page=200):
         url = f"{self.base_url}/Accounts"
-        response = requests.get(url, headers=self.headers)
+        page = 1
+        last_modified = None
+        seen_ids = set()
 
-        if response.status_code == 401:
-            self.refresh_access_token()
-            response = requests.get(url, headers=self.headers)
+        while True:
+            params = {
+                "page": page,
+                "per_page": per_page,
+                "sort_by": "Modified_Time",
+                "sort_order": "asc"
+            }
+            headers = {}
+            if modified_since:
+                headers["If-Modified-Since"] = modified_since
 
-        if response.status_code == 200:
-            accounts = response.json()['data']
-            processed_addresses = self.scraper.load_processed_addresses()
-
-            for account in accounts:
-                address = account.get('Address')
-                if address and address not in processed_addresses:
-                    print(f"Processing new address: {address}")
-                    business_data = self.scraper.scrape_business_info([address])
-                    if business_data:
-                        self.update_account(account['id'], account['$layout_id']['id'], business_data[0])
-                        self.scraper.save_processed_address(address)
-                else:
-                    print(f"Skipping already processed address: {address}")
+            response = self.transport.get(url, headers=headers, params=params)
 
-        else:
-            print("Failed to fetch accounts. Status code:", response.status_code)
-            print("Response:", response.json())
+            if response.status_code in (204, 304):
+                return
+            if response.status_code != 200:
+                logger.warning("Failed to fetch accounts. Status code: %s", response.status_code,
+                               extra={"response": response.json()})
+                return
+
+            payload = response.json()
+            for account in payload.get('data', []):
+                # Restarted listings overlap on the boundary timestamp, skip what was already yielded
+                if account['id'] in seen_ids:
+                    continue
+                seen_ids.add(account['id'])
+                last_modified = parse_zoho_time(account['Modified_Time'])
+                yield account
+
+            if not payload.get('info', {}).get('more_records'):
+                return
+
+            if (page + 1) * per_page > MAX_LISTING_RECORDS:
+                # Past the listing window: restart from the newest timestamp seen so far
+                restart_since = (last_modified - timedelta(seconds=1)).isoformat()
+                if restart_since == modified_since:
+                    logger.warning("Too many accounts share one Modified_Time to page past the listing limit")
+                    return
+                modified_since = restart_since
+                page = 1
+            else:
+                page += 1
 
     def update_account(self, record_id, layout_id, data):
         url = f"{self.base_url}/Accounts/{record_id}"
-        headers = self.headers.copy()
-        headers["Content-Type"] = "application/json"
+        headers = {"Content-Type": "application/json"}
 
         update_data = {
             "data": [
@@ -259,25 +475,19 @@ class ZohoCRMClient(WebDriverBase):
                 }
             ]
         }
+        if self.validate_record(update_data["data"][0]):
+            return False
 
-        response = requests.put(url, headers=headers, json=update_data)
-        if response.status_code == 401:
-            self.refresh_access_token()
-            headers["Authorization"] = self.headers["Authorization"]
-            response = requests.put(url, headers=headers, json=update_data)
+        response = self.transport.put(url, headers=headers, json=update_data)
 
         if response.status_code == 200:
-            print(f"Account {record_id} updated successfully!")
-
-            business_name = data['Name'].replace(" ", "_")
-            image_paths = [
-                f'images/{business_name}/image_{i}.jpg' for i in range(3)
-            ]
+            logger.info(f"Account {record_id} updated successfully!")
 
-            self.scraper.update_images_in_zoho(record_id, layout_id, image_paths)
+            return self.sync_images(record_id, self.image_paths_for(data), layout_id)
         else:
-            print(f"Failed to update account {record_id}. Status code:", response.status_code)
-            print("Response:", response.json())
+            logger.warning(f"Failed to update account {record_id}. Status code: {response.status_code}",
+                           extra={"response": response.json()})
+            return False
 
     def upload_images_to_account(self, record_id, image_paths):
         for image_path in image_paths:
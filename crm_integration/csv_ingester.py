@@ -0,0 +1,122 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class CsvTailIngester:
+    def __init__(self, csv_path, checkpoint_path=None, encoding='utf-8'):
+        self.csv_path = csv_path
+        self.checkpoint_path = checkpoint_path or f"{csv_path}.checkpoint.json"
+        self.encoding = encoding
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as checkpoint_file:
+                return json.load(checkpoint_file)
+        return self._empty_checkpoint()
+
+    def _empty_checkpoint(self, stat=None):
+        return {
+            "inode": stat.st_ino if stat else None,
+            "device": stat.st_dev if stat else None,
+            "offset": 0,
+            "header": None,
+            "row_start": 0,
+            "row_hash": None,
+        }
+
+    def commit(self, position):
+        self.checkpoint = position
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(position, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _resume_offset(self, csv_file, stat):
+        checkpoint = self.checkpoint
+        if checkpoint["inode"] is None:
+            return self._empty_checkpoint(stat)
+        if checkpoint["inode"] != stat.st_ino or checkpoint["device"] != stat.st_dev:
+            logger.info(f"{self.csv_path} was replaced, reading it from the start")
+            return self._empty_checkpoint(stat)
+        if stat.st_size < checkpoint["offset"]:
+            logger.info(f"{self.csv_path} was truncated, reading it from the start")
+            return self._empty_checkpoint(stat)
+
+        if checkpoint["row_hash"]:
+            # The last committed row must still be where we left it, or the file was rewritten
+            csv_file.seek(checkpoint["row_start"])
+            raw = csv_file.read(checkpoint["offset"] - checkpoint["row_start"])
+            if hashlib.sha256(raw).hexdigest() != checkpoint["row_hash"]:
+                logger.info(f"{self.csv_path} was rewritten, reading it from the start")
+                return self._empty_checkpoint(stat)
+        return dict(checkpoint)
+
+    def _read_record(self, csv_file):
+        # A record ends at a newline outside quotes; quoted fields may contain newlines
+        raw = b''
+        while True:
+            line = csv_file.readline()
+            if not line:
+                return None  # end of file, or a record the writer hasn't finished yet
+            raw += line
+            if raw.count(b'"') % 2 == 0 and raw.endswith(b'\n'):
+                return raw
+
+    def _parse(self, raw):
+        return next(csv.reader(io.StringIO(raw.decode(self.encoding))), [])
+
+    def iter_rows(self):
+        # Yields (row, position); commit(position) once the row has been handled
+        if not os.path.exists(self.csv_path):
+            return
+
+        with open(self.csv_path, 'rb') as csv_file:
+            stat = os.fstat(csv_file.fileno())
+            position = self._resume_offset(csv_file, stat)
+            csv_file.seek(position["offset"])
+
+            if position["offset"] == 0:
+                raw = self._read_record(csv_file)
+                if raw is None:
+                    return
+                position["header"] = [name.lstrip('\ufeff') for name in self._parse(raw)]
+                position["offset"] = csv_file.tell()
+                position["row_start"] = 0
+                position["row_hash"] = hashlib.sha256(raw).hexdigest()
+                self.commit(position)
+
+            header = position["header"]
+            while True:
+                row_start = csv_file.tell()
+                raw = self._read_record(csv_file)
+                if raw is None:
+                    return
+                values = self._parse(raw)
+                position = dict(
+                    position,
+                    offset=csv_file.tell(),
+                    row_start=row_start,
+                    row_hash=hashlib.sha256(raw).hexdigest()
+                )
+                if not values:
+                    continue
+                yield dict(zip(header, values)), position
+
+    def iter_batches(self, batch_size=100):
+        # Yields (rows, position) so a whole batch is committed after it has been written
+        batch = []
+        position = None
+        for row, position in self.iter_rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch, position
+                batch = []
+        if batch:
+            yield batch, position
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate
+
+logger = logging.getLogger(__name__)
+
+# Keys Zoho accepts in record payloads that aren't listed in the field metadata
+SYSTEM_KEYS = {'id', 'Layout', 'Owner', 'Tag', 'trigger', '$approved', '$currency_symbol'}
+
+
+class ModuleMetadata:
+    def __init__(self, module, fields, layouts):
+        self.module = module
+        self.fields = fields
+        self.layouts = layouts
+        self.by_api_name = {field['api_name']: field for field in fields}
+        self.by_label = {field['field_label'].casefold(): field for field in fields}
+        self.layouts_by_name = {layout['name'].casefold(): layout for layout in layouts}
+
+    def default_layout_id(self):
+        for layout in self.layouts:
+            if any(profile.get('default') for profile in layout.get('profiles', [])):
+                return layout['id']
+        return self.layouts[0]['id'] if self.layouts else None
+
+
+class FieldMetadataRegistry:
+    def __init__(self, transport, base_url, cache_dir='metadata_cache', ttl=24 * 3600, failure_ttl=60):
+        self.transport = transport
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._modules = {}  # module -> (metadata, loaded_at)
+        self._failed = {}  # module -> time of the last failed load
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, module):
+        return os.path.join(self.cache_dir, f"{module}.json")
+
+    def _read_cache(self, module):
+        path = self._cache_path(module)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as cache_file:
+            return json.load(cache_file)
+
+    def _write_cache(self, module, cached):
+        path = self._cache_path(module)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(cached, cache_file)
+        os.replace(tmp_path, path)
+
+    def _revalidate(self, url, key, cached):
+        # Returns the fresh list, or the cached one when Zoho answers 304 Not Modified
+        headers = {}
+        if cached:
+            if cached.get(f"{key}_etag"):
+                headers["If-None-Match"] = cached[f"{key}_etag"]
+            headers["If-Modified-Since"] = formatdate(cached['fetched_at'], usegmt=True)
+
+        response = self.transport.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[key], cached.get(f"{key}_etag")
+        if response.status_code == 200:
+            return response.json()[key], response.headers.get('ETag')
+
+        logger.warning(f"Failed to fetch {key} metadata. Status code: {response.status_code}")
+        if cached:
+            return cached[key], cached.get(f"{key}_etag")
+        return None, None
+
+    def load(self, module='Accounts', force=False):
+        cached = self._read_cache(module)
+        if cached and not force and time.time() - cached['fetched_at'] < self.ttl:
+            return ModuleMetadata(module, cached['fields'], cached['layouts'])
+
+        fields, fields_etag = self._revalidate(f"{self.base_url}/settings/fields?module={module}", 'fields', cached)
+        layouts, layouts_etag = self._revalidate(f"{self.base_url}/settings/layouts?module={module}", 'layouts', cached)
+        if fields is None or layouts is None:
+            return None
+
+        self._write_cache(module, {
+            "fetched_at": time.time(),
+            "fields": fields,
+            "fields_etag": fields_etag,
+            "layouts": layouts,
+            "layouts_etag": layouts_etag
+        })
+        return ModuleMetadata(module, fields, layouts)
+
+    def _store(self, module, metadata):
+        # A failed load keeps serving the copy already in memory, and isn't retried for failure_ttl
+        now = time.time()
+        if metadata is None:
+            self._failed[module] = now
+            current = self._modules.get(module)
+            return current[0] if current else None
+        self._failed.pop(module, None)
+        self._modules[module] = (metadata, now)
+        return metadata
+
+    def module(self, module='Accounts'):
+        with self._lock:
+            now = time.time()
+            metadata, loaded_at = self._modules.get(module, (None, 0))
+            if metadata is not None and now - loaded_at < self.ttl:
+                return metadata
+            if now - self._failed.get(module, -self.failure_ttl) < self.failure_ttl:
+                return metadata
+            # Past the TTL the disk cache is stale too, so load() revalidates with If-Modified-Since
+            return self._store(module, self.load(module))
+
+    def refresh(self, module='Accounts'):
+        with self._lock:
+            return self._store(module, self.load(module, force=True))
+
+    def api_name(self, label, module='Accounts'):
+        metadata = self.module(module)
+        field = metadata.by_label.get(label.casefold()) if metadata else None
+        return field['api_name'] if field else None
+
+    def field(self, api_name, module='Accounts'):
+        metadata = self.module(module)
+        return metadata.by_api_name.get(api_name) if metadata else None
+
+    def field_type(self, api_name, module='Accounts'):
+        field = self.field(api_name, module)
+        return field['data_type'] if field else None
+
+    def image_upload_fields(self, module='Accounts'):
+        metadata = self.module(module)
+        if metadata is None:
+            return []
+        return [
+            {
+                "api_name": field['api_name'],
+                "label": field['field_label'],
+                "max_length": field.get('length')
+            }
+            for field in metadata.fields if field['data_type'] == 'imageupload'
+        ]
+
+    def layout_ids(self, module='Accounts'):
+        metadata = self.module(module)
+        return {layout['name']: layout['id'] for layout in metadata.layouts} if metadata else {}
+
+    def default_layout_id(self, module='Accounts'):
+        metadata = self.module(module)
+        return metadata.default_layout_id() if metadata else None
+
+    def validate(self, record, module='Accounts'):
+        metadata = self.module(module)
+        if metadata is None:
+            return []  # no metadata to check against; let the API decide
+
+        errors = []
+        for key, value in record.items():
+            if key in SYSTEM_KEYS or key.startswith('$'):
+                continue
+            field = metadata.by_api_name.get(key)
+            if field is None:
+                errors.append(f"Unknown field '{key}'")
+                continue
+            if field.get('read_only'):
+                errors.append(f"Field '{key}' is read only")
+            length = field.get('length')
+            if isinstance(value, str) and length and field['data_type'] in ('text', 'textarea', 'website', 'phone', 'email') \
+                    and len(value) > length:
+                errors.append(f"Field '{key}' is longer than {length} characters")
+        return errors
@@ -0,0 +1,64 @@
+import mimetypes
+import os
+import uuid
+
+
+class MultipartFileStream:
+    # A multipart/form-data body that reads the file from disk as it is sent.
+    # It exposes read() and len() so requests streams it with a Content-Length.
+    def __init__(self, field_name, file_path, content_type=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        filename = os.path.basename(file_path)
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.preamble = (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{field_name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+        self.epilogue = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+        self.file_size = os.path.getsize(file_path)
+        self.file = open(file_path, 'rb')
+        self.position = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
+    def seek(self, offset, whence=0):
+        # Only rewinding is needed, for retries
+        self.position = 0
+        self.file.seek(0)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self) - self.position
+        chunks = []
+        while size > 0 and self.position < len(self):
+            preamble_end = len(self.preamble)
+            file_end = preamble_end + self.file_size
+            if self.position < preamble_end:
+                chunk = self.preamble[self.position:self.position + size]
+            elif self.position < file_end:
+                chunk = self.file.read(min(size, file_end - self.position))
+                if not chunk:
+                    raise IOError(f"{self.file_path} shrank while uploading")
+            else:
+                offset = self.position - file_end
+                chunk = self.epilogue[offset:offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,64 @@
+import json
+import os
+from base.rate_limit import TokenBucket
+from crm_integration.crm_client import ZohoCRMClient
+
+# orgs.json:
+# {"orgs": {"acme": {"config_path": "orgs/acme/config.json", "weight": 2, "requests_per_minute": 600}},
+#  "service": {"browsers": 4, "lease_db": "org_leases.db", "lease_ttl": 60}}
+# config_path is the org's own credentials file, laid out like config.json; data_dir defaults to its folder
+
+
+class OrgConfig:
+    def __init__(self, name, config_path, data_dir=None, weight=1, requests_per_minute=None, request_burst=None):
+        self.name = name
+        self.config_path = config_path
+        self.data_dir = data_dir or os.path.dirname(os.path.abspath(config_path))
+        self.weight = weight
+        self.requests_per_minute = requests_per_minute
+        self.request_burst = request_burst
+
+    def rate_limiter(self):
+        if not self.requests_per_minute:
+            return None
+        return TokenBucket.per_minute(self.requests_per_minute, self.request_burst)
+
+    def client(self):
+        return ZohoCRMClient(
+            config_path=self.config_path, data_dir=self.data_dir, rate_limiter=self.rate_limiter()
+        )
+
+
+class OrgRegistry:
+    def __init__(self, path='orgs.json'):
+        self.path = path
+        self.settings = {}
+        self.orgs = self.load(path)
+
+    def load(self, path):
+        with open(path, 'r') as registry_file:
+            registry = json.load(registry_file)
+        entries = registry['orgs']
+        # Service-wide options for the process serving these orgs
+        self.settings = registry.get('service', {})
+        base_dir = os.path.dirname(os.path.abspath(path))
+        orgs = {}
+        for name, entry in entries.items():
+            entry = dict(entry)
+            for key in ('config_path', 'data_dir'):
+                if entry.get(key) and not os.path.isabs(entry[key]):
+                    entry[key] = os.path.join(base_dir, entry[key])
+            orgs[name] = OrgConfig(name, **entry)
+        return orgs
+
+    def names(self):
+        return sorted(self.orgs)
+
+    def org(self, name):
+        return self.orgs[name]
+
+    def __iter__(self):
+        return iter(self.orgs[name] for name in self.names())
+
+    def __len__(self):
+        return len(self.orgs)
@@ -0,0 +1,77 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+
+def parse_zoho_time(value):
+    # Zoho returns ISO 8601 timestamps with an offset, e.g. 2024-01-02T15:24:33+05:30
+    return datetime.fromisoformat(value)
+
+
+class SyncState:
+    # Changes are written every save_every updates; callers save() once they finish a listing
+    def __init__(self, state_path='sync_state.json', save_every=200):
+        self.state_path = state_path
+        self.save_every = save_every
+        self.modified_time = None
+        # Ids already handled at exactly modified_time; Zoho does not order ties by id
+        self.record_ids = set()
+        self._unsaved = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, 'r') as state_file:
+            state = json.load(state_file)
+        self.modified_time = state.get('modified_time')
+        self.record_ids = set(state.get('record_ids', []))
+
+    def save(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as state_file:
+            json.dump({
+                "modified_time": self.modified_time,
+                "record_ids": sorted(self.record_ids)
+            }, state_file)
+        os.replace(tmp_path, self.state_path)
+        self._unsaved = 0
+
+    def _changed(self):
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def reset(self):
+        self.modified_time = None
+        self.record_ids = set()
+        self._unsaved = 0
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def if_modified_since(self):
+        if not self.modified_time:
+            return None
+        # Step back one second so records sharing the mark's timestamp are listed again;
+        # is_newer() drops the ones already handled using the record id tiebreaker.
+        since = parse_zoho_time(self.modified_time) - timedelta(seconds=1)
+        return since.isoformat()
+
+    def is_newer(self, record):
+        if not self.modified_time:
+            return True
+        record_time = parse_zoho_time(record['Modified_Time'])
+        mark_time = parse_zoho_time(self.modified_time)
+        if record_time != mark_time:
+            return record_time > mark_time
+        return str(record['id']) not in self.record_ids
+
+    def advance(self, record):
+        if not self.is_newer(record):
+            return
+        if self.modified_time and parse_zoho_time(record['Modified_Time']) == parse_zoho_time(self.modified_time):
+            self.record_ids.add(str(record['id']))
+        else:
+            self.modified_time = record['Modified_Time']
+            self.record_ids = {str(record['id'])}
+        self._changed()
@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TokenStore:
+    # An org's credentials file; every writer holds an OS file lock so processes sharing it can't interleave
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._thread_lock = threading.Lock()
+
+    def read(self):
+        with open(self.path, 'r') as token_file:
+            return json.load(token_file)
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as token_file:
+            json.dump(data, token_file)
+            token_file.flush()
+            os.fsync(token_file.fileno())
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def locked(self):
+        # Yields the stored credentials; call save() before leaving to write changes under the same lock
+        with self._thread_lock:
+            with open(self.lock_path, 'a+') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield self.read()
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def save(self, data):
+        # Only call while holding locked()
+        self._write(data)
+
+    def update(self, **changes):
+        with self.locked() as data:
+            data.update(changes)
+            self.save(data)
+            return data
@@ -0,0 +1,239 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+from base.metrics import API_REQUEST_SECONDS, API_RETRIES, RATE_LIMITED, TOKEN_REFRESHES
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Safe to resend after a timeout or a 5xx; a POST may already have created the records
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Record ids and other long numeric path segments collapse into one latency bucket
+ID_SEGMENT = re.compile(r'/\d{6,}(?=/|$)')
+
+
+def rate_limit_delay(headers):
+    retry_after = headers.get('Retry-After')
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+
+    reset = headers.get('X-RATELIMIT-RESET')
+    if reset and reset.isdigit():
+        reset = int(reset)
+        if reset > 1e12:  # epoch milliseconds
+            return max(0.0, reset / 1000 - time.time())
+        if reset > 1e9:  # epoch seconds
+            return max(0.0, reset - time.time())
+        return float(reset)
+    return None
+
+
+def request_not_sent(error):
+    # Refused connections, DNS failures and connect timeouts never reached Zoho;
+    # a reset or read timeout may come after Zoho applied the request
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def backoff_delay(attempt, base, cap, headers=None):
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if headers is not None:
+        header_delay = rate_limit_delay(headers)
+        if header_delay is not None:
+            delay = max(delay, min(header_delay, cap))
+    return delay
+
+
+class ZohoTransport:
+    def __init__(self, config, on_token_refreshed=None, pool_size=10, max_retries=5,
+                 backoff_base=0.5, backoff_cap=30, timeout=60, token_store=None, rate_limiter=None):
+        self.config = config
+        self.on_token_refreshed = on_token_refreshed
+        # token_store persists refreshed tokens for every process sharing the org; rate_limiter is its API budget
+        self.token_store = token_store
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.accounts_url = config.get('accounts_url', 'https://accounts.zoho.com')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._token_lock = threading.Lock()
+        self._token_generation = 0
+        self._blocked_until = 0
+        self.latency = defaultdict(lambda: deque(maxlen=1000))
+
+    @property
+    def auth_header(self):
+        return f"Zoho-oauthtoken {self.config['access_token']}"
+
+    def refresh_access_token(self, seen_generation=None):
+        with self._token_lock:
+            # Another thread already refreshed while this one waited for the lock
+            if seen_generation is not None and seen_generation != self._token_generation:
+                return True
+            if self.token_store is None:
+                return self._refresh_token()
+
+            with self.token_store.locked() as stored:
+                # Another process serving this org refreshed first; its token is still good
+                if stored.get('access_token') and stored['access_token'] != self.config['access_token']:
+                    self._set_access_token(stored['access_token'])
+                    return True
+                if not self._refresh_token():
+                    return False
+                stored['access_token'] = self.config['access_token']
+                self.token_store.save(stored)
+                return True
+
+    def _refresh_token(self):
+        url = f"{self.accounts_url}/oauth/v2/token"
+        params = {
+            "refresh_token": self.config['refresh_token'],
+            "client_id": self.config['client_id'],
+            "client_secret": self.config['client_secret'],
+            "grant_type": "refresh_token"
+        }
+        response = self.session.post(url, params=params, timeout=self.timeout)
+        new_tokens = response.json() if response.content else {}
+        if response.status_code != 200 or 'access_token' not in new_tokens:
+            TOKEN_REFRESHES.inc(outcome='failed')
+            logger.error("Failed to refresh access token", extra={"response": new_tokens})
+            return False
+
+        TOKEN_REFRESHES.inc(outcome='ok')
+        self._set_access_token(new_tokens['access_token'])
+        if self.on_token_refreshed:
+            self.on_token_refreshed(new_tokens['access_token'])
+        return True
+
+    def _set_access_token(self, access_token):
+        self.config['access_token'] = access_token
+        self._token_generation += 1
+
+    def endpoint_key(self, method, url):
+        path = url.split('?', 1)[0]
+        path = path.replace(self.config.get('api_domain', ''), '')
+        return f"{method} {ID_SEGMENT.sub('/{id}', path)}"
+
+    def _backoff(self, attempt, response=None):
+        headers = response.headers if response is not None else None
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, headers)
+
+    def _rewind(self, kwargs):
+        # Uploads are file handles; put them back at the start before resending
+        files = kwargs.get('files') or {}
+        for value in files.values():
+            handle = value[1] if isinstance(value, tuple) else value
+            if hasattr(handle, 'seek'):
+                handle.seek(0)
+        data = kwargs.get('data')
+        if hasattr(data, 'seek'):
+            data.seek(0)
+
+    def _track_rate_limit(self, response):
+        if response.headers.get('X-RATELIMIT-REMAINING') == '0':
+            delay = rate_limit_delay(response.headers)
+            if delay:
+                self._blocked_until = time.time() + min(delay, self.backoff_cap)
+
+    def request(self, method, url, headers=None, idempotent=None, **kwargs):
+        # idempotent overrides the method's default, e.g. for an upsert keyed on duplicate check fields
+        kwargs.setdefault('timeout', self.timeout)
+        key = self.endpoint_key(method, url)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        refreshed = False
+        attempt = 0
+
+        while True:
+            wait = self._blocked_until - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            request_headers = dict(headers or {})
+            request_headers["Authorization"] = self.auth_header
+            generation = self._token_generation
+
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+                status = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not (idempotent or request_not_sent(e)):
+                    raise
+                API_RETRIES.inc(reason='connection')
+                logger.warning("%s failed (%s), retrying", key, e, extra={"endpoint": key, "attempt": attempt})
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                self._rewind(kwargs)
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                self.latency[key].append(elapsed)
+                API_REQUEST_SECONDS.observe(elapsed, endpoint=key, status=status)
+
+            self._track_rate_limit(response)
+            if response.status_code == 429:
+                RATE_LIMITED.inc(endpoint=key)
+
+            if response.status_code == 401 and not refreshed:
+                refreshed = True
+                if self.refresh_access_token(seen_generation=generation):
+                    self._rewind(kwargs)
+                    continue
+
+            # A 429 was turned away before Zoho did anything, so even a POST can go again
+            retryable = idempotent or response.status_code == 429
+            if response.status_code in RETRY_STATUS_CODES and retryable and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                API_RETRIES.inc(reason=response.status_code)
+                logger.warning("%s returned %s, retrying in %.1fs", key, response.status_code, delay,
+                               extra={"endpoint": key, "status": response.status_code, "attempt": attempt})
+                time.sleep(delay)
+                attempt += 1
+                self._rewind(kwargs)
+                continue
+
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def latency_summary(self):
+        summary = {}
+        for key, samples in self.latency.items():
+            ordered = sorted(samples)
+            summary[key] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max": ordered[-1]
+            }
+        return summary
+
+    def close(self):
+        self.session.close()
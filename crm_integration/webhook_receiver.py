@@ -0,0 +1,205 @@
+import hmac
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Zoho allows a notification channel to live for at most one day
+MAX_CHANNEL_LIFETIME = timedelta(hours=24)
+
+
+def parse_form_ids(values):
+    # Form bodies carry ids as repeated fields, a comma-separated list or a JSON array
+    ids = []
+    for value in values:
+        value = value.strip()
+        if value.startswith('['):
+            ids.extend(json.loads(value))
+        else:
+            ids.extend(part.strip() for part in value.split(',') if part.strip())
+    return ids
+
+
+def parse_payload(content_type, body):
+    # Returns the notification as a dict, or None when the body isn't one
+    if content_type.split(';')[0].strip().lower() == 'application/x-www-form-urlencoded':
+        fields = parse_qs(body.decode('utf-8'))
+        payload = {key: values[-1] for key, values in fields.items() if key != 'ids'}
+        payload['ids'] = parse_form_ids(fields.get('ids', []))
+        return payload
+    payload = json.loads(body or b'{}')
+    return payload if isinstance(payload, dict) else None
+
+
+class NotificationReceiver:
+    def __init__(self, on_ids, token, host='0.0.0.0', port=8085, path='/zoho/notify', dedup_size=10000):
+        # on_ids(module, operation, ids) is called for every new, verified event
+        self.on_ids = on_ids
+        self.token = token
+        self.path = path
+        self.dedup_size = dedup_size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.received = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def _handler_class(self):
+        receiver = self
+
+        class NotificationHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != receiver.path:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = parse_payload(self.headers.get('Content-Type', ''), self.rfile.read(length))
+                except ValueError:
+                    payload = None
+                if payload is None or not isinstance(payload.get('ids', []), list):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                query_token = parse_qs(url.query).get('token', [None])[0]
+                if not receiver.verify(payload.get('token') or query_token):
+                    receiver.rejected += 1
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+
+                # Answer straight away; Zoho retries deliveries that are slow to acknowledge
+                self.send_response(200)
+                self.end_headers()
+                receiver.handle(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return NotificationHandler
+
+    def verify(self, token):
+        if not token:
+            return False
+        return hmac.compare_digest(str(token), str(self.token))
+
+    def _is_duplicate(self, key):
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return True
+            self._seen[key] = True
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+            return False
+
+    def handle(self, payload):
+        self.received += 1
+        module = payload.get('module', 'Accounts')
+        operation = payload.get('operation')
+        server_time = payload.get('server_time')
+        fresh_ids = []
+        for record_id in payload.get('ids', []):
+            if self._is_duplicate((module, operation, str(record_id), server_time)):
+                self.duplicates += 1
+            else:
+                fresh_ids.append(str(record_id))
+        if fresh_ids:
+            try:
+                self.on_ids(module, operation, fresh_ids)
+            except Exception as e:
+                logger.warning(f"Failed to queue notified records {fresh_ids}: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='notification-receiver', daemon=True)
+        self._thread.start()
+        logger.info(f"Listening for Zoho notifications on port {self.server.server_address[1]}{self.path}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class NotificationChannel:
+    def __init__(self, client, notify_url, token, channel_id=None, events=('Accounts.all',),
+                 lifetime=timedelta(hours=23), renew_margin=timedelta(hours=1)):
+        self.client = client
+        self.notify_url = notify_url
+        self.token = token
+        # Zoho channel ids are numeric
+        self.channel_id = channel_id or str(uuid.uuid4().int % 10 ** 15)
+        self.events = list(events)
+        self.lifetime = min(lifetime, MAX_CHANNEL_LIFETIME)
+        self.renew_margin = renew_margin
+        self.expires_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _watch(self, method):
+        expires_at = datetime.now(timezone.utc) + self.lifetime
+        payload = {
+            "watch": [
+                {
+                    "channel_id": self.channel_id,
+                    "events": self.events,
+                    "channel_expiry": expires_at.replace(microsecond=0).isoformat(),
+                    "token": self.token,
+                    "notify_url": self.notify_url
+                }
+            ]
+        }
+        response = self.client.transport.request(
+            method, f"{self.client.base_url}/actions/watch",
+            headers={"Content-Type": "application/json"}, json=payload
+        )
+        if response.status_code != 200:
+            logger.warning(f"Failed to {'subscribe' if method == 'POST' else 'renew'} notification channel. "
+                           f"Status code: {response.status_code}", extra={"response": response.text})
+            return False
+        self.expires_at = expires_at
+        return True
+
+    def subscribe(self):
+        return self._watch('POST')
+
+    def renew(self):
+        return self._watch('PATCH')
+
+    def unsubscribe(self):
+        response = self.client.transport.request(
+            'DELETE', f"{self.client.base_url}/actions/watch", params={"channel_ids": self.channel_id}
+        )
+        return response.status_code == 200
+
+    def _renew_loop(self):
+        while not self._stop.is_set():
+            if self.expires_at is None:
+                wait = 60
+            else:
+                wait = (self.expires_at - self.renew_margin - datetime.now(timezone.utc)).total_seconds()
+            if self._stop.wait(max(wait, 0)):
+                return
+            if not (self.renew() or self.subscribe()):
+                self._stop.wait(60)
+
+    def start(self):
+        self.subscribe()
+        self._thread = threading.Thread(target=self._renew_loop, name='notification-renewal', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.unsubscribe()
@@ -0,0 +1,130 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from data_scraper.normalize import normalize_address
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SCRAPED = 'scraped'
+SYNCED = 'synced'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS addresses (
+    address_key TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    record_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS addresses_status ON addresses (status);
+CREATE INDEX IF NOT EXISTS addresses_record_id ON addresses (record_id);
+"""
+
+
+class ProcessedAddressStore:
+    def __init__(self, db_path='processed_addresses.db', legacy_csv='processed_addresses.csv'):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        if legacy_csv and os.path.exists(legacy_csv):
+            self.import_legacy_csv(legacy_csv)
+
+    def connection(self):
+        # sqlite3 connections can't be shared across threads; WAL lets them read while one writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def import_legacy_csv(self, csv_path):
+        imported_path = f"{csv_path}.imported"
+        now = time.time()
+        with open(csv_path, 'r', newline='', encoding='utf-8') as file:
+            rows = [
+                (normalize_address(line.strip()), line.strip(), SYNCED, now, now)
+                for line in file if line.strip()
+            ]
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO addresses (address_key, address, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        os.replace(csv_path, imported_path)
+        logger.info(f"Imported {len(rows)} addresses from {csv_path}")
+
+    def get(self, address):
+        return self.connection().execute(
+            "SELECT * FROM addresses WHERE address_key = ?", (normalize_address(address),)
+        ).fetchone()
+
+    def status(self, address):
+        row = self.get(address)
+        return row['status'] if row else None
+
+    def is_processed(self, address):
+        # Scraped isn't done: the account only has the data once the write-back succeeds
+        return self.status(address) == SYNCED
+
+    def mark(self, address, status, record_id=None, error=None, attempted=False):
+        now = time.time()
+        with self.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO addresses (address_key, address, status, attempts, record_id, last_error,
+                                       created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (address_key) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = addresses.attempts + excluded.attempts,
+                    record_id = COALESCE(excluded.record_id, addresses.record_id),
+                    last_error = excluded.last_error,
+                    updated_at = excluded.updated_at
+                """,
+                (normalize_address(address), address, status, 1 if attempted else 0,
+                 record_id, error, now, now)
+            )
+
+    def mark_pending(self, address, record_id=None):
+        self.mark(address, PENDING, record_id=record_id)
+
+    def mark_scraped(self, address, record_id=None):
+        self.mark(address, SCRAPED, record_id=record_id, attempted=True)
+
+    def mark_synced(self, address, record_id=None):
+        self.mark(address, SYNCED, record_id=record_id)
+
+    def mark_failed(self, address, error, record_id=None):
+        self.mark(address, FAILED, record_id=record_id, error=str(error), attempted=True)
+
+    def addresses_with_status(self, status):
+        return [
+            row['address'] for row in
+            self.connection().execute("SELECT address FROM addresses WHERE status = ?", (status,))
+        ]
+
+    def unsynced(self, older_than=0):
+        # (address, record_id) of rows scraped at least older_than seconds ago but never written back
+        rows = self.connection().execute(
+            "SELECT address, record_id FROM addresses WHERE status = ? AND updated_at <= ? ORDER BY updated_at",
+            (SCRAPED, time.time() - older_than)
+        )
+        return [(row['address'], row['record_id']) for row in rows]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
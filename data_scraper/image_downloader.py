@@ -0,0 +1,237 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from base.metrics import IMAGE_BYTES, IMAGE_DOWNLOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mime TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_seen_at ON urls (seen_at);
+CREATE TABLE IF NOT EXISTS records (
+    record_key TEXT PRIMARY KEY,
+    digests TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+}
+
+
+def sniff_mime(head, fallback=None):
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head.startswith(b'BM'):
+        return 'image/bmp'
+    if fallback:
+        return fallback.split(';', 1)[0].strip()
+    return 'application/octet-stream'
+
+
+class ImageDownloader:
+    # The manifest lives in SQLite so each download writes its own rows instead of rewriting one JSON file.
+    # URLs not seen for url_ttl seconds are forgotten; their objects stay on disk under the records using them.
+    def __init__(self, root='images', max_workers=8, manifest_path=None, timeout=30, url_ttl=30 * 24 * 3600):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.manifest_path = manifest_path or os.path.join(root, 'manifest.db')
+        self.timeout = timeout
+        self.url_ttl = url_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        legacy_path = os.path.join(root, 'manifest.json')
+        if os.path.exists(legacy_path):
+            self.import_legacy_manifest(legacy_path)
+        self.prune_urls()
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.manifest_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def import_legacy_manifest(self, manifest_path):
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        now = time.time()
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO objects (digest, path, mime, size) VALUES (?, ?, ?, ?)",
+                [(digest, obj["path"], obj["mime"], obj["size"]) for digest, obj in manifest.get("objects", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, digest, seen_at) VALUES (?, ?, ?)",
+                [(url, digest, now) for url, digest in manifest.get("urls", {}).items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO records (record_key, digests, updated_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(digests), now) for key, digests in manifest.get("records", {}).items()]
+            )
+        os.replace(manifest_path, f"{manifest_path}.imported")
+        logger.info(f"Imported {len(manifest.get('records', {}))} records from {manifest_path}")
+
+    def prune_urls(self):
+        self._pruned_at = time.time()
+        with self.connection() as conn:
+            pruned = conn.execute("DELETE FROM urls WHERE seen_at < ?", (time.time() - self.url_ttl,)).rowcount
+        if pruned:
+            logger.info(f"Forgot {pruned} image URLs not seen for {self.url_ttl}s")
+        return pruned
+
+    def _object(self, digest):
+        return self.connection().execute(
+            "SELECT path, mime, size FROM objects WHERE digest = ?", (digest,)
+        ).fetchone()
+
+    def object_path(self, digest, mime):
+        extension = MIME_EXTENSIONS.get(mime, '.bin')
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}{extension}")
+
+    def _store(self, chunks, content_type=None):
+        digest = hashlib.sha256()
+        head = b''
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                for chunk in chunks:
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+
+            mime = sniff_mime(head, content_type)
+            digest = digest.hexdigest()
+            path = self.object_path(digest, mime)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(tmp_path)  # same bytes already stored for another record
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO objects (digest, path, mime, size) VALUES (?, ?, ?, ?)",
+                (digest, path, mime, size)
+            )
+        return digest
+
+    def fetch(self, url):
+        if not url:
+            return None
+
+        if not url.startswith('data:image'):
+            row = self.connection().execute(
+                "SELECT urls.digest, objects.path FROM urls JOIN objects ON objects.digest = urls.digest WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row and os.path.exists(row[1]):
+                with self.connection() as conn:
+                    conn.execute("UPDATE urls SET seen_at = ? WHERE url = ?", (time.time(), url))
+                return row[0]
+
+        if url.startswith('data:image'):
+            header, encoded = url.split(',', 1)
+            digest = self._store([base64.b64decode(encoded)], header[5:].split(';', 1)[0])
+            source = 'data_uri'
+        else:
+            with IMAGE_DOWNLOAD_SECONDS.time(outcome='error') as labels:
+                try:
+                    with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                        if response.status_code != 200:
+                            labels['outcome'] = response.status_code
+                            logger.warning(f"Failed to download image {url}. Status code: {response.status_code}")
+                            return None
+                        digest = self._store(response.iter_content(CHUNK_SIZE), response.headers.get('Content-Type'))
+                except requests.RequestException as e:
+                    logger.warning(f"Error downloading image {url}: {e}")
+                    return None
+                labels['outcome'] = 'ok'
+            source = 'http'
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO urls (url, digest, seen_at) VALUES (?, ?, ?)", (url, digest, time.time())
+                )
+        IMAGE_BYTES.inc(self._object(digest)[2], source=source)
+        return digest
+
+    def download(self, record_key, image_urls):
+        futures = [self.executor.submit(self.fetch, url) for url in image_urls]
+        digests = [future.result() for future in futures]
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO records (record_key, digests, updated_at) VALUES (?, ?, ?)",
+                (record_key, json.dumps(digests), time.time())
+            )
+        # A long-running service prunes once a day
+        if time.time() - self._pruned_at > 24 * 3600:
+            self.prune_urls()
+        return self.paths_for(record_key)
+
+    def paths_for(self, record_key):
+        row = self.connection().execute("SELECT digests FROM records WHERE record_key = ?", (record_key,)).fetchone()
+        paths = []
+        for digest in json.loads(row[0]) if row else []:
+            obj = self._object(digest) if digest else None
+            paths.append(obj[0] if obj else None)
+        return paths
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,100 @@
+import re
+import unicodedata
+
+try:
+    import phonenumbers
+except ImportError:
+    phonenumbers = None
+
+# Common street designators, so "123 Main Street" and "123 main st." share one key
+ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "boulevard": "blvd",
+    "drive": "dr",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "suite": "ste",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+PUNCTUATION = re.compile(r"[.,;:#'\"()]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_address(address):
+    if not address:
+        return ''
+    address = unicodedata.normalize('NFKC', address).casefold()
+    address = PUNCTUATION.sub(' ', address)
+    tokens = [ADDRESS_ABBREVIATIONS.get(token, token) for token in WHITESPACE.split(address) if token]
+    return ' '.join(tokens)
+
+
+# Legal-form and filler words that vary between sources for the same business
+NAME_STOPWORDS = {
+    "the", "inc", "incorporated", "llc", "ltd", "limited", "co", "company", "corp", "corporation",
+    "plc", "gmbh", "pvt", "pty", "and", "&",
+}
+NAME_PUNCTUATION = re.compile(r"[^\w\s&]+")
+
+# Calling codes for the regions we see most; anything else needs phonenumbers installed
+COUNTRY_CALLING_CODES = {"US": "1", "CA": "1", "GB": "44", "AU": "61", "IN": "91", "PK": "92", "AE": "971"}
+
+
+def normalize_name(name):
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKC', name).casefold()
+    name = NAME_PUNCTUATION.sub(' ', name)
+    tokens = [token for token in WHITESPACE.split(name) if token and token not in NAME_STOPWORDS]
+    return ' '.join(tokens)
+
+
+def normalize_phone(phone, region='US'):
+    # E.164 (+14155550123); phonenumbers does this properly when installed, otherwise a digits-only best effort
+    if not phone:
+        return ''
+    if phonenumbers is not None:
+        try:
+            parsed = phonenumbers.parse(phone, region)
+        except phonenumbers.NumberParseException:
+            return ''
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
+        return ''
+    if phone.strip().startswith('+'):
+        return f"+{digits}"
+    if digits.startswith('00'):
+        return f"+{digits[2:]}"
+    calling_code = COUNTRY_CALLING_CODES.get(region, '')
+    if calling_code == '1' and len(digits) == 11 and digits.startswith('1'):
+        return f"+{digits}"
+    return f"+{calling_code}{digits.lstrip('0')}"
+
+
+def website_domain(url):
+    if not url:
+        return ''
+    url = url.strip().casefold()
+    url = re.sub(r"^[a-z][a-z0-9+.-]*://", "", url)
+    host = re.split(r"[/?#]", url, maxsplit=1)[0]
+    host = host.rsplit('@', 1)[-1].split(':', 1)[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    return host.strip('.')
+
+
+def trigrams(text):
+    # Padded character trigrams, so short names and word boundaries still produce grams
+    if not text:
+        return frozenset()
+    padded = f"  {text} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
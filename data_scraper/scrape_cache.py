@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from base.metrics import CACHE_LOOKUPS
+from data_scraper.normalize import normalize_address
+
+
+class ScrapeCache:
+    def __init__(self, max_entries=10000, ttl=7 * 24 * 3600, negative_ttl=6 * 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, business or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(self, address):
+        # Returns (found, business); business is None for a cached "no knowledge panel" result
+        key = normalize_address(address)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result='miss')
+                return False, None
+
+            expires_at, business = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result='expired')
+                return False, None
+
+            self._entries.move_to_end(key)
+            if business is None:
+                self.negative_hits += 1
+                CACHE_LOOKUPS.inc(result='negative_hit')
+            else:
+                self.hits += 1
+                CACHE_LOOKUPS.inc(result='hit')
+            return True, business
+
+    def store(self, address, business):
+        self._put(address, dict(business), self.ttl)
+
+    def store_negative(self, address):
+        self._put(address, None, self.negative_ttl)
+
+    def _put(self, address, business, ttl):
+        key = normalize_address(address)
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, business)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, address):
+        with self._lock:
+            self._entries.pop(normalize_address(address), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0
+            }
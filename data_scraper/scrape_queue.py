@@ -0,0 +1,172 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from data_scraper.normalize import normalize_address
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DEAD = 'dead'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrape_queue (
+    address_key TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scrape_queue_due ON scrape_queue (status, priority, not_before);
+"""
+
+
+class ScrapeQueue:
+    # Addresses waiting to be scraped, highest priority first. A failed address comes back after an
+    # exponential backoff until max_attempts, then sits in the dead-letter list until revived.
+    def __init__(self, db_path='scrape_queue.db', max_attempts=5, backoff_base=60, backoff_cap=6 * 3600,
+                 clock=time.time):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def push(self, address, payload, priority=0.0):
+        # A queued address keeps the higher of its priorities; leased and dead entries are left alone
+        now = self.clock()
+        with self.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO scrape_queue (address_key, address, payload, priority, not_before, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (address_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    priority = MAX(scrape_queue.priority, excluded.priority),
+                    updated_at = excluded.updated_at
+                WHERE scrape_queue.status = 'queued'
+                """,
+                (normalize_address(address), address, json.dumps(payload), priority, now, now)
+            )
+
+    def pop(self):
+        # Leases the most urgent address that is due, or returns None
+        now = self.clock()
+        with self._lock, self.connection() as conn:
+            row = conn.execute(
+                "SELECT address_key, payload FROM scrape_queue WHERE status = ? AND not_before <= ? "
+                "ORDER BY priority DESC, not_before LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE scrape_queue SET status = ?, updated_at = ? WHERE address_key = ?", (LEASED, now, row[0])
+            )
+        return json.loads(row[1])
+
+    def next_due_in(self):
+        # Seconds until the next queued address is due; None when nothing is queued
+        row = self.connection().execute(
+            "SELECT MIN(not_before) FROM scrape_queue WHERE status = ?", (QUEUED,)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - self.clock())
+
+    def complete(self, address):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM scrape_queue WHERE address_key = ?", (normalize_address(address),))
+
+    def backoff(self, attempts):
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def retry(self, address, error):
+        # Returns the delay before the next attempt, or None once the address is dead-lettered
+        key = normalize_address(address)
+        with self._lock, self.connection() as conn:
+            row = conn.execute("SELECT attempts FROM scrape_queue WHERE address_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            attempts = row[0] + 1
+            if attempts >= self.max_attempts:
+                status, delay = DEAD, None
+            else:
+                status, delay = QUEUED, self.backoff(attempts)
+            conn.execute(
+                "UPDATE scrape_queue SET status = ?, attempts = ?, not_before = ?, last_error = ?, updated_at = ? "
+                "WHERE address_key = ?",
+                (status, attempts, self.clock() + (delay or 0), str(error), self.clock(), key)
+            )
+        if delay is None:
+            logger.warning(f"Giving up on {address} after {attempts} attempts: {error}")
+        return delay
+
+    def dead_letter(self, address, error):
+        # For failures another attempt won't fix
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE scrape_queue SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? "
+                "WHERE address_key = ?",
+                (DEAD, str(error), self.clock(), normalize_address(address))
+            )
+
+    def defer(self, address, delay):
+        # Back in the queue after delay without using up an attempt, e.g. while the scraper is paused
+        now = self.clock()
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE scrape_queue SET status = ?, not_before = ?, updated_at = ? WHERE address_key = ?",
+                (QUEUED, now + delay, now, normalize_address(address))
+            )
+
+    def recover(self):
+        # Leases held by a process that stopped before finishing them
+        with self.connection() as conn:
+            recovered = conn.execute(
+                "UPDATE scrape_queue SET status = ? WHERE status = ?", (QUEUED, LEASED)
+            ).rowcount
+        if recovered:
+            logger.info(f"Requeued {recovered} addresses leased before the last shutdown")
+        return recovered
+
+    def dead_letters(self):
+        rows = self.connection().execute(
+            "SELECT address, attempts, last_error FROM scrape_queue WHERE status = ? ORDER BY updated_at", (DEAD,)
+        )
+        return [{"address": address, "attempts": attempts, "error": error} for address, attempts, error in rows]
+
+    def revive(self, address=None):
+        # Gives dead-lettered addresses (all of them when address is None) a fresh set of attempts
+        query = "UPDATE scrape_queue SET status = ?, attempts = 0, not_before = ?, updated_at = ? WHERE status = ?"
+        params = [QUEUED, self.clock(), self.clock(), DEAD]
+        if address is not None:
+            query += " AND address_key = ?"
+            params.append(normalize_address(address))
+        with self.connection() as conn:
+            return conn.execute(query, params).rowcount
+
+    def stats(self):
+        rows = self.connection().execute("SELECT status, COUNT(*) FROM scrape_queue GROUP BY status")
+        return dict(rows.fetchall())
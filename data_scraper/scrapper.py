@@ -1,111 +1,192 @@
+import logging
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-import time
 import csv
-import requests
 import os
+import time
+from urllib.parse import quote_plus
+from base.metrics import EXTRACT_SECONDS, IMAGE_UPLOAD_SECONDS, SCRAPE_SECONDS
 from base.webdriver_base import WebDriverBase
-import base64
+from data_scraper.image_downloader import ImageDownloader
+from data_scraper.normalize import normalize_address
+from data_scraper.scrape_cache import ScrapeCache
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = "https://www.google.com/search?q={query}&hl=en"
+CRM_WEB_URL = "https://crm.zoho.com"
+
+TITLE_XPATH = "//div[@data-attrid='title']"
+WEBSITE_XPATH = "//a[.//span[text()='Website']]"
+PHONE_XPATH = "//a[@data-phone-number]"
+IMAGE_XPATHS = [
+    "//div[@id='media_result_group']//span[text()='See photos']/preceding-sibling::g-img//img",
+    "//div[@id='media_result_group']//img[contains(@alt, 'Map of')]",
+    "//div[@id='media_result_group']//span[text()='See outside']/preceding-sibling::g-img//img",
+]
+
+# Reads the whole knowledge panel in one round-trip instead of one find_element per field
+EXTRACT_PANEL_JS = """
+var first = function (xpath) {
+    return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+};
+var title = first(arguments[0]);
+var website = first(arguments[1]);
+var phone = first(arguments[2]);
+return {
+    name: title ? title.innerText : null,
+    website: website ? website.href : null,
+    phone: phone ? phone.getAttribute('data-phone-number') : null,
+    images: arguments[3].map(function (xpath) {
+        var image = first(xpath);
+        return image ? image.getAttribute('src') : null;
+    })
+};
+"""
+
+# Google's rate-limit interstitial (/sorry/) and CAPTCHA challenges, checked after every results page
+BLOCKED_PAGE_JS = """
+var text = document.body ? document.body.innerText : '';
+return location.pathname.indexOf('/sorry/') === 0
+    || text.indexOf('unusual traffic') !== -1
+    || document.querySelector("iframe[src*='recaptcha'], #captcha-form, .g-recaptcha") !== null;
+"""
+
+class KnowledgePanelNotFound(LookupError):
+    pass
+
+class ScrapeBlocked(RuntimeError):
+    pass
+
+class ScrapeTimeout(RuntimeError):
+    # The results page didn't load in time; worth another attempt, unlike KnowledgePanelNotFound
+    pass
 
 class BusinessScraper(WebDriverBase):
-    def __init__(self):
-        super().__init__()
-        self.processed_file = 'processed_addresses.csv'
-
-    def scrape_business_info(self, addresses):
-        processed_addresses = self.load_processed_addresses()
-        business_data = []
-
-        for address in addresses:
-            if address in processed_addresses:
-                print(f"Skipping already processed address: {address}")
-                continue
-
-            self.driver.get("https://www.google.com")
-            search_box = self.wait_for_element(By.NAME, "q")
-            if search_box:
-                search_box.clear()
-                search_box.send_keys(address)
-                search_box.send_keys(Keys.RETURN)
-
-            time.sleep(3)  # Wait for the page to load
-
-            try:
-                # Extract business information
-                name = self._get_element_text("//div[@data-attrid='title']")
-                website = self._get_element_attribute("//a[.//span[text()='Website']]", "href")
-                phone = self._get_element_attribute("//a[@data-phone-number]", "data-phone-number")
-                image_urls = self._get_image_urls()
-
-                self.download_images(image_urls, name)
-
-                business_data.append({
-                    "Name": name,
-                    "Website": website,
-                    "Phone": phone,
-                    "Images": image_urls,
-                    "Address": address
-                })
-
-                # Mark address as processed
-                self.save_processed_address(address)
-
-            except Exception as e:
-                print(f"Error extracting data for {address}: {e}")
-
-        return business_data
+    def __init__(self, driver=None, image_downloader=None, fast=False, cache=None,
+                 search_url=None, rate_limiter=None):
+        # fast: headless, no images/CSS/fonts, direct results URL and single-script extraction
+        self.fast = fast
+        # Overridable so the benchmarks can point the scraper at recorded result pages
+        self.search_url = search_url or SEARCH_URL
+        # Optional DomainRateLimiter, shared by every scraper hitting the same search engine
+        self.rate_limiter = rate_limiter
+        super().__init__(driver, headless=fast, fast=fast)
+        self.image_downloader = image_downloader or ImageDownloader()
+        self.cache = cache or ScrapeCache()
+
+    def scrape_address(self, address, download=True):
+        # download=False leaves Image_Paths empty so a separate stage can fetch the images
+        found, business = self.cache.lookup(address)
+        if found:
+            if business is None:
+                raise KnowledgePanelNotFound(f"No knowledge panel for {address} (cached)")
+            business = dict(business, Address=address)
+        else:
+            with SCRAPE_SECONDS.time(mode='fast' if self.fast else 'browser', outcome='error') as labels:
+                try:
+                    if self.fast:
+                        business = self._scrape_address_fast(address)
+                    else:
+                        business = self._scrape_address(address)
+                except KnowledgePanelNotFound:
+                    labels['outcome'] = 'no_panel'
+                    self.cache.store_negative(address)
+                    raise
+                except ScrapeBlocked:
+                    labels['outcome'] = 'blocked'
+                    raise
+                except ScrapeTimeout:
+                    labels['outcome'] = 'timeout'
+                    raise
+                labels['outcome'] = 'ok'
+            self.cache.store(address, business)
+
+        if download:
+            business["Image_Paths"] = self.download_images(business["Images"], address)
+        return business
+
+    def _scrape_address(self, address):
+        self._open("https://www.google.com")
+        search_box = self.wait_for_element(By.NAME, "q")
+        if search_box:
+            search_box.clear()
+            search_box.send_keys(address)
+            search_box.send_keys(Keys.RETURN)
+
+        self._wait_for_results(address)
+
+        # Extract business information
+        with EXTRACT_SECONDS.time(field='name'):
+            name = self._get_element_text(TITLE_XPATH)
+        with EXTRACT_SECONDS.time(field='website'):
+            website = self._get_element_attribute(WEBSITE_XPATH, "href")
+        with EXTRACT_SECONDS.time(field='phone'):
+            phone = self._get_element_attribute(PHONE_XPATH, "data-phone-number")
+        with EXTRACT_SECONDS.time(field='images'):
+            image_urls = self._get_image_urls()
+
+        return self._build_business(address, name, website, phone, image_urls)
+
+    def _scrape_address_fast(self, address):
+        self._open(self.search_url.format(query=quote_plus(address)))
+        self._wait_for_results(address)
+
+        # One round trip covers every XPath, so it is timed as a single extraction
+        with EXTRACT_SECONDS.time(field='panel'):
+            panel = self.driver.execute_script(EXTRACT_PANEL_JS, TITLE_XPATH, WEBSITE_XPATH, PHONE_XPATH, IMAGE_XPATHS)
+        return self._build_business(address, panel['name'], panel['website'], panel['phone'], panel['images'])
+
+    def _open(self, url):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+        self.driver.get(url)
+        self.check_blocked()
+
+    def _wait_for_results(self, address, timeout=10):
+        panel = self.wait_for_knowledge_panel(timeout=timeout)
+        if panel is None:
+            # A block page has no results list either, so it looks like a timeout until checked
+            self.check_blocked()
+            raise ScrapeTimeout(f"Results for {address} didn't load within {timeout}s")
+        return panel
+
+    def check_blocked(self):
+        if self.driver.execute_script(BLOCKED_PAGE_JS):
+            raise ScrapeBlocked(f"Search blocked at {self.driver.current_url}")
+
+    def _build_business(self, address, name, website, phone, image_urls):
+        if not name:
+            raise KnowledgePanelNotFound(f"No knowledge panel for {address}")
+
+        return {
+            "Name": name,
+            "Website": website,
+            "Phone": phone,
+            "Images": image_urls,
+            "Image_Paths": [],
+            "Address": address
+        }
+
+    def _first_element(self, xpath):
+        # find_elements returns an empty list for a missing field instead of raising
+        elements = self.driver.find_elements(By.XPATH, xpath)
+        return elements[0] if elements else None
 
     def _get_element_text(self, xpath):
-        try:
-            return self.driver.find_element(By.XPATH, xpath).text
-        except:
-            return None
+        element = self._first_element(xpath)
+        return element.text if element else None
 
     def _get_element_attribute(self, xpath, attribute):
-        try:
-            return self.driver.find_element(By.XPATH, xpath).get_attribute(attribute)
-        except:
-            return None
+        element = self._first_element(xpath)
+        return element.get_attribute(attribute) if element else None
 
     def _get_image_urls(self):
-        image_urls = []
-        try:
-            image_element1 = self.driver.find_element(By.XPATH, "//div[@id='media_result_group']//span[text()='See photos']/preceding-sibling::g-img//img")
-            image_urls.append(image_element1.get_attribute('src') if image_element1 else None)
-        except:
-            image_urls.append(None)
-
-        try:
-            image_element2 = self.driver.find_element(By.XPATH, "//div[@id='media_result_group']//img[contains(@alt, 'Map of')]")
-            image_urls.append(image_element2.get_attribute('src') if image_element2 else None)
-        except:
-            image_urls.append(None)
+        return [self._get_element_attribute(xpath, 'src') for xpath in IMAGE_XPATHS]
 
-        try:
-            image_element3 = self.driver.find_element(By.XPATH, "//div[@id='media_result_group']//span[text()='See outside']/preceding-sibling::g-img//img")
-            image_urls.append(image_element3.get_attribute('src') if image_element3 else None)
-        except:
-            image_urls.append(None)
-
-        return image_urls
-
-    def download_images(self, image_urls, business_name):
-        business_name = business_name.replace(" ", "_")
-        image_folder = os.path.join('images', business_name)
-        os.makedirs(image_folder, exist_ok=True)
-
-        for i, url in enumerate(image_urls):
-            if url:
-                if url.startswith('data:image'):
-                    header, encoded = url.split(',', 1)
-                    data = base64.b64decode(encoded)
-                    with open(os.path.join(image_folder, f"image_{i}.jpg"), 'wb') as file:
-                        file.write(data)
-                else:
-                    response = requests.get(url)
-                    if response.status_code == 200:
-                        with open(os.path.join(image_folder, f"image_{i}.jpg"), 'wb') as file:
-                            file.write(response.content)
+    def download_images(self, image_urls, address):
+        # Files are stored by content hash and listed per address in the downloader's manifest
+        return self.image_downloader.download(normalize_address(address), image_urls)
 
     def save_to_csv(self, data, filename='business_data.csv'):
         keys = data[0].keys()
@@ -114,40 +195,47 @@ class BusinessScraper(WebDriverBase):
             dict_writer.writeheader()
             dict_writer.writerows(data)
 
-    def update_images_in_zoho(self, record_id, layout_id, image_paths):
-        url = f"https://crm.zoho.com/crm/org875401012/tab/Accounts/{record_id}/edit?layoutId={layout_id}"
+    def update_images_in_zoho(self, record_id, layout_id, image_paths, org_id=None, crm_url=None):
+        start = time.perf_counter()
+        try:
+            self._update_images_in_zoho(record_id, layout_id, image_paths, org_id, crm_url or CRM_WEB_URL)
+        finally:
+            IMAGE_UPLOAD_SECONDS.observe(time.perf_counter() - start, method='browser')
+
+    def _update_images_in_zoho(self, record_id, layout_id, image_paths, org_id, crm_url):
+        # Without an org id the CRM opens the record in the signed-in user's default org
+        org_segment = f"/org{org_id}" if org_id else ""
+        url = f"{crm_url}/crm{org_segment}/tab/Accounts/{record_id}/edit?layoutId={layout_id}"
         self.driver.get(url)
-        time.sleep(10)
+        self.wait_for_document_ready(timeout=20, step='edit_page')
+        self.wait_for_any_xpath(
+            ["//lyte-button[starts-with(@data-zcqa, 'Image Upload')]", "//crux-image-component"],
+            timeout=20, step='edit_page'
+        )
+        self.wait_for_network_idle(timeout=20, step='edit_page')
+
+        attach_button = (By.XPATH, "//button[.//text()='Attach']")
 
         try:
             for i, image_path in enumerate(image_paths, start=1):
+                if not image_path:
+                    continue
                 absolute_image_path = os.path.abspath(image_path)
                 if os.path.exists(absolute_image_path):
-                    if not self.click_element(By.XPATH, f"//lyte-button[@data-zcqa='Image Upload {i}']"):
+                    upload_button = (By.XPATH, f"//lyte-button[@data-zcqa='Image Upload {i}']")
+                    if not self.click_element(*upload_button):
                         self.click_element(By.XPATH, f"//crux-image-component")
-                        time.sleep(2)
-                        self.click_element(By.XPATH, f"//lyte-button[@data-zcqa='Image Upload {i}']")
-                    time.sleep(2)
+                        self.wait_for_clickable(*upload_button, timeout=5, step='image_menu')
+                        self.click_element(*upload_button)
                     file_input = self.wait_for_element(By.XPATH, "//input[@type='file']")
                     if file_input:
                         file_input.send_keys(absolute_image_path)
-                        time.sleep(10)
-                        self.click_element(By.XPATH, "//button[.//text()='Attach']")
-                        time.sleep(2)
+                        self.wait_for_upload_complete(*attach_button, timeout=30)
+                        self.click_element(*attach_button)
+                        self.wait_for_modal_close(*attach_button, timeout=10)
 
             self.click_element(By.XPATH, "//button[.//text()='Save']")
-            time.sleep(3)
+            self.wait_until(lambda driver: '/edit' not in driver.current_url, timeout=15, step='save')
 
         except Exception as e:
-            print(f"Error updating images: {e}")
-
-    def load_processed_addresses(self):
-        if not os.path.exists(self.processed_file):
-            return set()
-
-        with open(self.processed_file, 'r', newline='', encoding='utf-8') as file:
-            return set(line.strip() for line in file)
-
-    def save_processed_address(self, address):
-        with open(self.processed_file, 'a', newline='', encoding='utf-8') as file:
-            file.write(f"{address}\n")
+            logger.warning(f"Error updating images: {e}", extra={"record_id": record_id})
@@ -1,12 +1,7 @@
-import time
-from crm_integration.crm_client import ZohoCRMClient
+import sys
+from cli import main
 
-
-def main():
-    crm_client = ZohoCRMClient()
-    while True:
-        crm_client.fetch_and_process_accounts()
-        time.sleep(30)
+# Kept so existing `python main.py` deployments keep running the service; see cli.py for the commands
 
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,363 @@
+import logging
+import queue
+import threading
+import time
+from base.driver_pool import DriverPool
+from base.profiling import profile_call
+from crm_integration.sync_state import parse_zoho_time
+from data_scraper.scrapper import SEARCH_URL, BusinessScraper, KnowledgePanelNotFound, ScrapeBlocked
+from data_scraper.scrape_cache import ScrapeCache
+from data_scraper.scrape_queue import LEASED, QUEUED, ScrapeQueue
+from data_scraper.normalize import normalize_address
+from pipeline.engine import DEFERRED, Pipeline, Stage
+from pipeline.journal import PipelineJournal
+
+logger = logging.getLogger(__name__)
+
+
+def creation_priority(record):
+    # Newer accounts sort first, so freshly created ones jump ahead of a backlog of old ones
+    created = record.get('Created_Time') or record.get('Modified_Time')
+    try:
+        return parse_zoho_time(created).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class AccountPipeline:
+    # CRM poll -> scrape (browser-bound) -> image fetch (network/disk) -> CRM write-back (network)
+    def __init__(self, client, scrape_workers=2, image_workers=4, write_workers=4, queue_size=50,
+                 poll_interval=30, max_pages=50, journal_path='pipeline_journal.db', driver_pool=None,
+                 queue_path='scrape_queue.db', rate_limiter=None, block_cooldown=300, max_block_cooldown=3600,
+                 bulk_client=None, bulk_batch_size=1000, bulk_flush_interval=60, redrive_after=3600, org=None):
+        self.client = client
+        self.address_store = client.address_store
+        self.image_downloader = client.image_downloader
+        self.cache = ScrapeCache()
+        self.poll_interval = poll_interval
+        self.search_url = client.search_url or SEARCH_URL
+        self.scrape_queue = ScrapeQueue(queue_path)
+        # A multi-org service passes one limiter for every org, since they all search the same engine
+        self.rate_limiter = rate_limiter or client.scrape_rate_limiter
+        # Scraped addresses still unwritten after redrive_after seconds go through the pipeline again
+        self.redrive_after = redrive_after
+        self.block_cooldown = block_cooldown
+        self.max_block_cooldown = max_block_cooldown
+        self._blocks = 0
+        self._blocks_lock = threading.Lock()
+        # With a bulk client, write-back collects accounts and sends each batch as one Bulk Write upload
+        self.bulk_client = bulk_client
+        self.bulk_batch_size = bulk_batch_size
+        self.bulk_flush_interval = bulk_flush_interval
+        self._bulk_items = []
+        self._bulk_lock = threading.Lock()
+        self._bulk_flusher = None
+        # A multi-org service passes its fair-share view of one shared pool instead
+        self.driver_pool = driver_pool or DriverPool(size=scrape_workers, max_pages=max_pages, headless=True, fast=True)
+        self.pipeline = Pipeline(
+            [
+                # Only a worker's worth of buffering, so the scrape queue's priority order decides what runs next
+                Stage('scrape', self.scrape, workers=scrape_workers, queue_size=scrape_workers),
+                Stage('images', self.fetch_images, workers=image_workers, queue_size=queue_size),
+                Stage('write', self.write_back, workers=write_workers, queue_size=queue_size),
+            ],
+            journal=PipelineJournal(journal_path),
+            # Every org's pipeline reports into the same gauges, one series each
+            metric_labels={'org': org} if org else None
+        )
+        self._stop = threading.Event()
+        self._poller = None
+        self._notified = queue.Queue(maxsize=10000)
+        self._notify_worker = None
+        self._dispatcher = None
+        self._queued = threading.Event()
+        self._profile = None
+
+    def enqueue(self, record_id, layout_id, address, priority):
+        # The priority rides along in the payload, so an item that comes back keeps its place
+        payload = {"record_id": record_id, "layout_id": layout_id, "address": address, "priority": priority}
+        self.scrape_queue.push(address, payload, priority)
+        self._queued.set()
+
+    def _track(self, item):
+        # Items resumed from the pipeline journal never went through the queue; a no-op for the rest
+        self.scrape_queue.push(item["address"], item, item.get("priority", 0.0))
+
+    def _blocked(self, item, error):
+        # Each block in a row doubles the pause, up to max_block_cooldown; a successful scrape resets it
+        with self._blocks_lock:
+            self._blocks += 1
+            cooldown = min(self.max_block_cooldown, self.block_cooldown * 2 ** (self._blocks - 1))
+        logger.warning(f"Scraping blocked: {error}", extra={"address": item["address"]})
+        self.rate_limiter.pause(self.search_url, cooldown)
+        self._track(item)
+        self.scrape_queue.defer(item["address"], cooldown)
+
+    def scrape(self, item):
+        address = item["address"]
+        paused_for = self.rate_limiter.paused_for(self.search_url)
+        if paused_for:
+            # Handed out before the pause started; it waits in the queue rather than holding a browser
+            self._track(item)
+            self.scrape_queue.defer(address, paused_for)
+            return None
+
+        try:
+            with self.driver_pool.lease() as driver:
+                scraper = BusinessScraper(
+                    driver=driver, image_downloader=self.image_downloader,
+                    fast=True, cache=self.cache, search_url=self.search_url, rate_limiter=self.rate_limiter
+                )
+                business = scraper.scrape_address(address, download=False)
+        except ScrapeBlocked as e:
+            self._blocked(item, e)
+            return None
+        except KnowledgePanelNotFound as e:
+            # Cached as a negative result, so another attempt would fail the same way
+            self.address_store.mark_failed(address, e, record_id=item["record_id"])
+            self._track(item)
+            self.scrape_queue.dead_letter(address, e)
+            return None
+        except Exception as e:
+            self.address_store.mark_failed(address, e, record_id=item["record_id"])
+            self._track(item)
+            delay = self.scrape_queue.retry(address, e)
+            if delay is not None:
+                logger.warning(f"Scraping {address} failed, retrying in {delay:.0f}s: {e}")
+            return None
+
+        with self._blocks_lock:
+            self._blocks = 0
+        self.address_store.mark_scraped(address, record_id=item["record_id"])
+        self.scrape_queue.complete(address)
+        return dict(item, business=business)
+
+    def fetch_images(self, item):
+        business = item["business"]
+        business["Image_Paths"] = self.image_downloader.download(
+            normalize_address(item["address"]), business["Images"]
+        )
+        return item
+
+    def write_back(self, item):
+        if self.bulk_client is not None:
+            with self._bulk_lock:
+                self._bulk_items.append(item)
+                full = len(self._bulk_items) >= self.bulk_batch_size
+            if full:
+                self.flush_bulk_writes()
+            # Finished by flush_bulk_writes(), so it stays in the journal until Zoho has it
+            return DEFERRED
+        if not self.client.update_account(item["record_id"], item["layout_id"], item["business"]):
+            raise RuntimeError(f"Failed to update account {item['record_id']}")
+        self.address_store.mark_synced(item["address"], record_id=item["record_id"])
+        return item
+
+    def flush_bulk_writes(self):
+        with self._bulk_lock:
+            items, self._bulk_items = self._bulk_items, []
+        if not items:
+            return
+        by_record = {item["record_id"]: item for item in items}
+        try:
+            results = self.bulk_client.write_businesses((item["record_id"], item["business"]) for item in items)
+        except Exception as e:
+            logger.warning(f"Bulk write of {len(items)} accounts failed: {e}")
+            for record_id in by_record:
+                self.pipeline.fail(record_id, e)
+            return
+        for result in results:
+            item = by_record[result["key"]]
+            if result["status"] == 'success':
+                self.address_store.mark_synced(item["address"], record_id=item["record_id"])
+                self.pipeline.complete(item["record_id"])
+            else:
+                self.pipeline.fail(item["record_id"], result["errors"])
+
+    def _bulk_flush_loop(self):
+        while not self._stop.wait(self.bulk_flush_interval):
+            try:
+                self.flush_bulk_writes()
+            except Exception as e:
+                logger.warning(f"Flushing bulk writes failed: {e}")
+
+    def poll_once(self, incremental=True):
+        # Without incremental, every account is listed and the sync state is left alone
+        sync_state = self.client.sync_state
+        modified_since = sync_state.if_modified_since() if incremental else None
+        try:
+            for account in self.client.iter_accounts(modified_since=modified_since):
+                if self._stop.is_set():
+                    return
+                if incremental and not sync_state.is_newer(account):
+                    continue
+
+                address = account.get('Address')
+                if address and not self.address_store.is_processed(address):
+                    self.enqueue(account['id'], account['$layout_id']['id'], address, creation_priority(account))
+                # Safe to move the mark once queued: the scrape queue is persistent
+                if incremental:
+                    sync_state.advance(account)
+        finally:
+            if incremental:
+                sync_state.save()
+
+    def backfill(self, bulk_client, fields=('Id', 'Address', 'Layout', 'Created_Time')):
+        # First-time load: stream every account from a Bulk Read job instead of paging GET /Accounts
+        submitted = 0
+        for row in bulk_client.iter_read('Accounts', fields=list(fields)):
+            if self._stop.is_set():
+                break
+            address = row.get('Address')
+            if address and not self.address_store.is_processed(address):
+                self.enqueue(row['Id'], row.get('Layout'), address, creation_priority(row))
+                submitted += 1
+        logger.info(f"Backfill queued {submitted} accounts")
+        return submitted
+
+    def notify(self, module, operation, ids):
+        # Called by the notification receiver; the lookups happen on the pipeline's own thread
+        if module != 'Accounts' or operation == 'delete':
+            return
+        for record_id in ids:
+            self._notified.put(record_id)
+
+    def _enqueue_record(self, record_id):
+        try:
+            account = self.client.get_account_details(record_id)
+        except Exception as e:
+            logger.warning(f"Failed to fetch account {record_id}: {e}")
+            return
+        address = account.get('Address') if account else None
+        if address and not self.address_store.is_processed(address):
+            self.enqueue(account['id'], account['$layout_id']['id'], address, creation_priority(account))
+
+    def _notify_loop(self):
+        while not self._stop.is_set():
+            try:
+                record_id = self._notified.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._enqueue_record(record_id)
+
+    def redrive_scraped(self):
+        # Scraped but never written: the write ran out of attempts, or the process stopped in between.
+        # The sync mark is already past these accounts, so they are looked up by id and queued again;
+        # the scrape cache usually answers the repeat scrape.
+        journaled = {key for key, _, _ in self.pipeline.journal.pending(max_attempts=self.pipeline.max_attempts)}
+        redriven = 0
+        for address, record_id in self.address_store.unsynced(self.redrive_after):
+            if self._stop.is_set():
+                break
+            if record_id and record_id not in journaled:
+                self._enqueue_record(record_id)
+                redriven += 1
+        if redriven:
+            logger.info(f"Re-queued {redriven} scraped accounts that were never written back")
+        return redriven
+
+    def profile_next_cycle(self, output_path='poll_cycle.prof', engine='cprofile'):
+        # The next poll (listing plus journal resume) runs under the profiler; stage workers are not sampled
+        self._profile = (output_path, engine)
+
+    def _poll_cycle(self):
+        self.poll_once()
+        self.pipeline.resume()
+        self.redrive_scraped()
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                profile, self._profile = self._profile, None
+                if profile:
+                    profile_call(self._poll_cycle, output_path=profile[0], engine=profile[1])
+                else:
+                    self._poll_cycle()
+            except Exception as e:
+                logger.warning(f"Polling accounts failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _dispatch(self):
+        paused_for = self.rate_limiter.paused_for(self.search_url)
+        if paused_for:
+            self._stop.wait(min(paused_for, self.poll_interval))
+            return
+        self._queued.clear()
+        item = self.scrape_queue.pop()
+        if item is None:
+            due_in = self.scrape_queue.next_due_in()
+            self._queued.wait(self.poll_interval if due_in is None else min(due_in, self.poll_interval))
+            return
+        # Blocks while the scrape stage is full, so the queue order decides what is scraped next
+        if not self.pipeline.submit(item["record_id"], item):
+            # Already resumed from the pipeline journal, which finishes it
+            self.scrape_queue.complete(item["address"])
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._dispatch()
+            except Exception as e:
+                logger.warning(f"Dispatching queued addresses failed: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def start(self, poll=True):
+        # Without poll, accounts only come in through poll_once(), enqueue() or backfill()
+        self.scrape_queue.recover()
+        self.pipeline.start()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='scrape-dispatcher', daemon=True)
+        self._dispatcher.start()
+        if self.bulk_client is not None:
+            self._bulk_flusher = threading.Thread(target=self._bulk_flush_loop, name='bulk-writer', daemon=True)
+            self._bulk_flusher.start()
+        if not poll:
+            return
+        self._poller = threading.Thread(target=self._poll_loop, name='poller', daemon=True)
+        self._poller.start()
+        self._notify_worker = threading.Thread(target=self._notify_loop, name='notified-accounts', daemon=True)
+        self._notify_worker.start()
+
+    def stop(self, timeout=None):
+        # Stop accepting new accounts, then let every stage drain what it already has
+        self._stop.set()
+        self._queued.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout)
+        if self._poller:
+            self._poller.join(timeout)
+        if self._notify_worker:
+            self._notify_worker.join(timeout)
+        self.pipeline.shutdown(timeout)
+        if self.bulk_client is not None:
+            if self._bulk_flusher:
+                self._bulk_flusher.join(timeout)
+            # Whatever the drained stages left in the last partial batch
+            self.flush_bulk_writes()
+        self.driver_pool.close()
+
+    def wait_for_queue(self, interval=5, backoffs=True):
+        # Returns once every queued address has been scraped or dead-lettered; without backoffs,
+        # addresses waiting out a retry delay are left queued for the next run
+        while not self._stop.is_set():
+            stats = self.scrape_queue.stats()
+            if not stats.get(LEASED):
+                due_in = self.scrape_queue.next_due_in()
+                if not stats.get(QUEUED) or (not backoffs and due_in is not None and due_in > 0):
+                    return
+            self._stop.wait(interval)
+
+    def run_once(self, incremental=True, interval=1):
+        # One pass for `sync --once`: changed accounts go through the scrape queue like the service's do,
+        # and the pass ends once nothing is due, leaving retries for the next run
+        self.start(poll=False)
+        try:
+            self.poll_once(incremental)
+            self.pipeline.resume()
+            self.redrive_scraped()
+            self.wait_for_queue(interval, backoffs=False)
+        finally:
+            self.stop()
+
+    def wait(self):
+        while self._poller and self._poller.is_alive():
+            self._poller.join(1)
@@ -0,0 +1,155 @@
+import logging
+import queue
+import threading
+from base.metrics import METRICS, STAGE_SECONDS
+from pipeline.journal import PipelineJournal
+
+logger = logging.getLogger(__name__)
+
+STOP = object()
+# Returned by a last-stage handler that keeps the item to finish it later with complete() or fail()
+DEFERRED = object()
+
+
+class Stage:
+    def __init__(self, name, handler, workers=1, queue_size=100):
+        # handler(payload) returns the payload for the next stage, or None to drop the item
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.active_workers = 0
+        self.processed = 0
+        self.failed = 0
+
+
+class Pipeline:
+    def __init__(self, stages, journal=None, max_attempts=3, metric_labels=None):
+        self.stages = stages
+        self.journal = journal or PipelineJournal()
+        self.max_attempts = max_attempts
+        self.threads = []
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._stopping = threading.Event()
+        # Extra labels for this pipeline's metric series, e.g. the org it serves
+        self.metric_labels = metric_labels
+        self._queue_depth_gauge = METRICS.gauge('pipeline_queue_depth', 'Items waiting in each stage queue',
+                                                self._queue_depth, labels=metric_labels)
+
+    def _queue_depth(self):
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            stage.active_workers = stage.workers
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_worker, args=(index,), name=f"{stage.name}-{worker}", daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+        self.resume()
+
+    def resume(self):
+        # Also picks up items that failed earlier in this run, for another attempt
+        with self._lock:
+            in_flight = set(self._in_flight)
+        resumed = [
+            item for item in self.journal.pending(max_attempts=self.max_attempts) if item[0] not in in_flight
+        ]
+        for key, stage_index, payload in resumed:
+            self._enqueue(key, stage_index, payload)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} items from the pipeline journal")
+
+    def submit(self, key, payload):
+        # Blocks while the first stage's queue is full, which throttles the producer
+        with self._lock:
+            if key in self._in_flight:
+                return False
+        self.journal.record(key, 0, payload)
+        self._enqueue(key, 0, payload)
+        return True
+
+    def _enqueue(self, key, stage_index, payload):
+        with self._lock:
+            self._in_flight.add(key)
+        self.stages[stage_index].queue.put((key, payload))
+
+    def _run_worker(self, index):
+        stage = self.stages[index]
+        while True:
+            item = stage.queue.get()
+            if item is STOP:
+                break
+            key, payload = item
+
+            try:
+                with STAGE_SECONDS.time(stage=stage.name, outcome='error') as labels:
+                    result = stage.handler(payload)
+                    labels['outcome'] = 'ok' if result is not None else 'dropped'
+            except Exception as e:
+                with self._lock:
+                    stage.failed += 1
+                logger.warning(f"[{stage.name}] {key} failed: {e}", extra={"stage": stage.name, "key": key})
+                # Left in the journal at this stage; it is retried on the next resume
+                self.journal.failed(key, e)
+                self._finish(key)
+                continue
+
+            with self._lock:
+                stage.processed += 1
+            if result is DEFERRED:
+                continue
+            if result is None or index == len(self.stages) - 1:
+                self.journal.complete(key)
+                self._finish(key)
+            else:
+                self.journal.record(key, index + 1, result)
+                self.stages[index + 1].queue.put((key, result))
+
+        with self._lock:
+            stage.active_workers -= 1
+            last_worker = stage.active_workers == 0
+        if last_worker and index + 1 < len(self.stages):
+            # Everything before the STOP markers has been handed on, so the next stage can drain too
+            for _ in range(self.stages[index + 1].workers):
+                self.stages[index + 1].queue.put(STOP)
+
+    def _finish(self, key):
+        with self._lock:
+            self._in_flight.discard(key)
+
+    def complete(self, key):
+        self.journal.complete(key)
+        self._finish(key)
+
+    def fail(self, key, error):
+        # Stays in the journal at its current stage and is retried on the next resume
+        self.journal.failed(key, error)
+        self._finish(key)
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def shutdown(self, timeout=None):
+        # Finishes every item already accepted, stage by stage, then stops the workers
+        self._stopping.set()
+        for _ in range(self.stages[0].workers):
+            self.stages[0].queue.put(STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        self._queue_depth_gauge.remove(self._queue_depth, self.metric_labels)
+
+    def stats(self):
+        return {
+            stage.name: {
+                "queued": stage.queue.qsize(),
+                "processed": stage.processed,
+                "failed": stage.failed,
+                "workers": stage.active_workers
+            }
+            for stage in self.stages
+        }
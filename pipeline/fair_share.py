@@ -0,0 +1,92 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class FairShareScheduler:
+    # Shares a driver pool between orgs by weighted stride scheduling: among orgs waiting for a
+    # browser, the one with the lowest pass goes next, and each grant moves its pass on by 1/weight
+    def __init__(self, pool, slots=None):
+        self.pool = pool
+        self.slots = slots or pool.size
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._virtual_time = 0.0
+        self._tenants = {}
+
+    def tenant(self, name, weight=1):
+        with self._cond:
+            self._tenants.setdefault(name, {"weight": weight, "pass": self._virtual_time, "waiting": 0, "granted": 0})
+            self._tenants[name]["weight"] = weight
+        return TenantPool(self, name)
+
+    def _next_tenant(self):
+        waiting = [(tenant["pass"], name) for name, tenant in self._tenants.items() if tenant["waiting"]]
+        return min(waiting)[1] if waiting else None
+
+    def _acquire_slot(self, name, deadline=None):
+        with self._cond:
+            tenant = self._tenants[name]
+            if not tenant["waiting"]:
+                # An org that sat idle doesn't get to bank credit and then monopolise the pool
+                tenant["pass"] = max(tenant["pass"], self._virtual_time)
+            tenant["waiting"] += 1
+            while self._in_use >= self.slots or self._next_tenant() != name:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    tenant["waiting"] -= 1
+                    # This org may have been at the head of the line
+                    self._cond.notify_all()
+                    raise TimeoutError(f"No browser slot became free for org {name}")
+                self._cond.wait(remaining)
+            tenant["waiting"] -= 1
+            tenant["granted"] += 1
+            self._in_use += 1
+            self._virtual_time = tenant["pass"]
+            tenant["pass"] += 1.0 / tenant["weight"]
+            # More than one slot may be free, so let the next org in line check too
+            self._cond.notify_all()
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, name, timeout=None):
+        # timeout covers both the wait for a slot and the wait for a browser
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._acquire_slot(name, deadline)
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            with self.pool.lease(remaining) as driver:
+                yield driver
+        finally:
+            self._release_slot()
+
+    def remove(self, name):
+        with self._cond:
+            tenant = self._tenants.get(name)
+            if tenant and not tenant["waiting"]:
+                del self._tenants[name]
+
+    def stats(self):
+        with self._cond:
+            return {
+                name: {"weight": tenant["weight"], "waiting": tenant["waiting"], "granted": tenant["granted"]}
+                for name, tenant in self._tenants.items()
+            }
+
+
+class TenantPool:
+    # Looks like a DriverPool to AccountPipeline, but every lease goes through the fair scheduler
+    def __init__(self, scheduler, name):
+        self.scheduler = scheduler
+        self.name = name
+
+    def lease(self, timeout=None):
+        return self.scheduler.lease(self.name, timeout)
+
+    def close(self):
+        # The shared pool belongs to the multi-org service, which closes it once every org has stopped
+        self.scheduler.remove(self.name)
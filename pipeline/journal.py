@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipeline_items (
+    item_key TEXT PRIMARY KEY,
+    stage INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class PipelineJournal:
+    # Durable record of every item in flight and the stage it is waiting for,
+    # so a restarted pipeline resumes each item where it stopped
+    def __init__(self, db_path='pipeline_journal.db'):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def contains(self, key):
+        row = self.connection().execute(
+            "SELECT 1 FROM pipeline_items WHERE item_key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def record(self, key, stage, payload):
+        with self.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO pipeline_items (item_key, stage, payload, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (item_key) DO UPDATE SET
+                    stage = excluded.stage, payload = excluded.payload, updated_at = excluded.updated_at
+                """,
+                (key, stage, json.dumps(payload), time.time())
+            )
+
+    def failed(self, key, error):
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE pipeline_items SET attempts = attempts + 1, last_error = ?, updated_at = ? "
+                "WHERE item_key = ?",
+                (str(error), time.time(), key)
+            )
+
+    def complete(self, key):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM pipeline_items WHERE item_key = ?", (key,))
+
+    def pending(self, max_attempts=None):
+        query = "SELECT item_key, stage, payload FROM pipeline_items"
+        params = ()
+        if max_attempts is not None:
+            query += " WHERE attempts < ?"
+            params = (max_attempts,)
+        return [
+            (key, stage, json.loads(payload))
+            for key, stage, payload in self.connection().execute(query + " ORDER BY updated_at", params)
+        ]
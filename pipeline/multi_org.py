@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import math
+import os
+import socket
+import threading
+from base.driver_pool import DriverPool
+from base.rate_limit import DomainRateLimiter
+from pipeline.account_pipeline import AccountPipeline
+from pipeline.fair_share import FairShareScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class MultiOrgService:
+    # One AccountPipeline per org, all sharing a single browser pool through the fair-share scheduler.
+    # With a lease store, each worker process serves only the orgs it holds leases for.
+    def __init__(self, registry, lease_store=None, owner=None, browsers=4, max_pages=50, lease_ttl=60,
+                 poll_interval=30, scrape_workers=2, image_workers=4, write_workers=4, scrape_rate_limiter=None):
+        self.registry = registry
+        self.lease_store = lease_store
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.pipeline_options = {
+            "scrape_workers": scrape_workers,
+            "image_workers": image_workers,
+            "write_workers": write_workers,
+        }
+        self.driver_pool = DriverPool(size=browsers, max_pages=max_pages, headless=True, fast=True)
+        self.scheduler = FairShareScheduler(self.driver_pool)
+        # Every org searches the same engine from this process, so they share one limit and one pause
+        self.scrape_rate_limiter = scrape_rate_limiter or DomainRateLimiter(per_minute=30)
+        self.services = {}
+        self._stopping = {}  # org -> thread draining its pipeline
+        self._stopping_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._balancer = None
+
+    def start_org(self, name):
+        org = self.registry.org(name)
+        try:
+            client = org.client()
+            service = AccountPipeline(
+                client, poll_interval=self.poll_interval, journal_path=client.data_path('pipeline_journal.db'),
+                queue_path=client.data_path('scrape_queue.db'), rate_limiter=self.scrape_rate_limiter,
+                driver_pool=self.scheduler.tenant(name, org.weight), org=name, **self.pipeline_options
+            )
+            service.start()
+        except Exception as e:
+            logger.error(f"Failed to start org {name}: {e}", extra={"org": name})
+            if self.lease_store:
+                self.lease_store.release(name, self.owner)
+            return False
+        self.services[name] = service
+        logger.info(f"Serving org {name}", extra={"org": name, "owner": self.owner})
+        return True
+
+    def stop_org(self, name, timeout=None):
+        service = self.services.pop(name, None)
+        if service:
+            service.stop(timeout)
+            service.client.close()
+            logger.info(f"Stopped serving org {name}", extra={"org": name, "owner": self.owner})
+        with self._stopping_lock:
+            if self.lease_store:
+                self.lease_store.release(name, self.owner)
+            self._stopping.pop(name, None)
+
+    def stop_org_async(self, name, timeout=None):
+        # Draining an org can take a while; the balancer keeps renewing its lease meanwhile (see rebalance),
+        # so no other worker picks the org up until this one has let go of it
+        with self._stopping_lock:
+            if name in self._stopping:
+                return
+            thread = threading.Thread(target=self.stop_org, args=(name, timeout), name=f'stop-{name}', daemon=True)
+            self._stopping[name] = thread
+        thread.start()
+
+    def target_share(self):
+        live = self.lease_store.live_workers(self.lease_ttl)
+        return math.ceil(len(self.registry) / max(1, len(live)))
+
+    def _candidates(self):
+        # Each worker tries the orgs in its own order, so workers starting together don't all race for the same one
+        return sorted(
+            self.registry.names(),
+            key=lambda name: hashlib.sha1(f"{self.owner}/{name}".encode('utf-8')).hexdigest()
+        )
+
+    def rebalance(self):
+        if self.lease_store is None:
+            for name in self.registry.names():
+                if name not in self.services:
+                    self.start_org(name)
+            return
+
+        self.lease_store.heartbeat(self.owner)
+        share = self.target_share()
+        with self._stopping_lock:
+            # Orgs still draining stay leased to this worker until stop_org releases them
+            for name in sorted(self._stopping):
+                self.lease_store.acquire(name, self.owner, self.lease_ttl)
+            draining = set(self._stopping)
+
+        # Renew what this worker holds, handing back anything over its share so a newly joined worker can take it
+        active = sorted(name for name in list(self.services) if name not in draining)
+        for name in list(active):
+            if len(active) > share:
+                self.stop_org_async(name, timeout=self.lease_ttl / 2)
+                active.remove(name)
+            elif not self.lease_store.acquire(name, self.owner, self.lease_ttl):
+                logger.warning(f"Lost the lease on org {name}", extra={"org": name, "owner": self.owner})
+                self.stop_org_async(name, timeout=self.lease_ttl / 2)
+                active.remove(name)
+
+        for name in self._candidates():
+            if len(active) >= share:
+                break
+            if name not in self.services and name not in self._stopping \
+                    and self.lease_store.acquire(name, self.owner, self.lease_ttl):
+                if self.start_org(name):
+                    active.append(name)
+
+    def _balance_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.error(f"Rebalancing orgs failed: {e}")
+            # Renew well inside the lease lifetime
+            self._stop.wait(self.lease_ttl / 3)
+
+    def start(self):
+        self._balancer = threading.Thread(target=self._balance_loop, name='org-balancer', daemon=True)
+        self._balancer.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._balancer:
+            self._balancer.join(timeout)
+        with self._stopping_lock:
+            stopping = list(self._stopping.values())
+        for thread in stopping:
+            thread.join(timeout)
+        for name in list(self.services):
+            self.stop_org(name, timeout)
+        self.driver_pool.close()
+
+    def wait(self):
+        while self._balancer and self._balancer.is_alive():
+            self._balancer.join(1)
+
+    def stats(self):
+        return {
+            "owner": self.owner,
+            "orgs": {name: service.pipeline.stats() for name, service in self.services.items()},
+            "scrape_queues": {name: service.scrape_queue.stats() for name, service in self.services.items()},
+            "browsers": self.scheduler.stats()
+        }
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS org_leases (
+    org TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+"""
+
+
+class OrgLeaseStore:
+    # Lets several worker processes split the orgs between them; a lease that isn't renewed expires
+    # and the org is picked up by another worker. Every worker must open the same database file.
+    def __init__(self, db_path='org_leases.db', clock=time.time):
+        self.db_path = db_path
+        self.clock = clock
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def heartbeat(self, owner):
+        self.connection().execute(
+            "INSERT INTO workers (owner, seen_at) VALUES (?, ?) "
+            "ON CONFLICT(owner) DO UPDATE SET seen_at = excluded.seen_at",
+            (owner, self.clock())
+        )
+
+    def live_workers(self, ttl):
+        rows = self.connection().execute("SELECT owner FROM workers WHERE seen_at >= ?", (self.clock() - ttl,))
+        return [row[0] for row in rows]
+
+    def acquire(self, org, owner, ttl):
+        # Takes a free or expired lease, or renews one this owner already holds
+        now = self.clock()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO org_leases (org, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(org) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE org_leases.owner = excluded.owner OR org_leases.expires_at < ?",
+                (org, owner, now + ttl, now)
+            )
+            holder = conn.execute("SELECT owner FROM org_leases WHERE org = ?", (org,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return holder == owner
+
+    def release(self, org, owner):
+        self.connection().execute("DELETE FROM org_leases WHERE org = ? AND owner = ?", (org, owner))
+
+    def holders(self):
+        now = self.clock()
+        rows = self.connection().execute("SELECT org, owner FROM org_leases WHERE expires_at >= ?", (now,))
+        return dict(rows.fetchall())
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
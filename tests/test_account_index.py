@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from crm_integration.account_index import CREATE, SKIP, UPDATE, AccountIndex
+
+
+class AccountIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = AccountIndex(os.path.join(self.tmp.name, 'account_index.db'))
+        self.index.add('1', {
+            "Account_Name": "Blue Door Bistro LLC",
+            "Phone": "(217) 555-0142",
+            "Website": "https://bluedoor.example.com",
+            "Address": "12 Main Street, Springfield",
+        })
+
+    def tearDown(self):
+        self.index.connection().close()
+        self.tmp.cleanup()
+
+    def test_exact_phone_alone_matches(self):
+        match = self.index.match({"Number": "+1 217 555 0142"})
+        self.assertEqual(match.record_id, '1')
+        self.assertNotEqual(match.action, CREATE)
+
+    def test_name_alone_never_matches(self):
+        match = self.index.match({"Account_Name": "Blue Door Bistro"})
+        self.assertEqual(match.action, CREATE)
+
+    def test_rerun_row_is_skipped_despite_billing_placeholders(self):
+        # What monitor_csv_and_update_crm writes, as it comes back from the incremental sync
+        self.index.add('2', {
+            "Account_Name": "Lakeside Hardware",
+            "Number": "217-555-0199",
+            "Address": "900 Lake Blvd, Riverside",
+            "Billing_Street": "Billing_Street",
+            "Billing_City": "Billing_City",
+            "Billing_Code": "Billing_Code",
+        })
+        match = self.index.match({"Account_Name": "Lakeside Hardware", "Number": "217-555-0199",
+                                  "Address": "900 Lake Blvd, Riverside"})
+        self.assertEqual((match.action, match.record_id), (SKIP, '2'))
+
+    def test_changed_row_is_an_update(self):
+        match = self.index.match({"Account_Name": "Blue Door Bistro", "Number": "2175550142",
+                                  "Address": "12 Main St Suite 2, Springfield"})
+        self.assertEqual((match.action, match.record_id), (UPDATE, '1'))
+
+    def test_unknown_business_is_created(self):
+        match = self.index.match({"Account_Name": "Totally New Place", "Number": "(312) 555-0000",
+                                  "Address": "1 Elm St"})
+        self.assertEqual(match.action, CREATE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from benchmarks.mock_zoho import MockZohoServer, make_accounts
+from crm_integration.bulk import ZohoBulkClient
+from crm_integration.transport import ZohoTransport
+
+
+class FakeClient:
+    # The slice of ZohoCRMClient the bulk client uses
+    def __init__(self, config):
+        self.config = config
+        self.transport = ZohoTransport(config, backoff_base=0.01)
+        self.synced_images = []
+
+    def image_paths_for(self, business):
+        return business.get('Image_Paths', [])
+
+    def sync_images(self, record_id, image_paths):
+        self.synced_images.append(record_id)
+        return True
+
+
+class BulkClientTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.accounts = make_accounts(5)
+        # Two rows per result page, so reading takes three jobs
+        self.mock = MockZohoServer(self.accounts, latency=0, jitter=0, bulk_page_size=2).start()
+        config = dict(self.mock.bulk_urls(), access_token='mock', api_domain=self.mock.url)
+        self.client = FakeClient(config)
+        self.bulk = ZohoBulkClient(self.client, poll_interval=0, work_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.client.transport.close()
+        self.mock.stop()
+        self.tmp.cleanup()
+
+    def test_iter_read_streams_every_page(self):
+        rows = list(self.bulk.iter_read('Accounts', fields=['Id', 'Address', 'Layout']))
+        self.assertEqual([row['Id'] for row in rows], [account['id'] for account in self.accounts])
+        self.assertEqual(rows[0]['Address'], self.accounts[0]['Address'])
+        self.assertEqual(self.mock.calls['POST /crm/bulk/v2/read'], 3)
+
+    def test_write_businesses_round_trip(self):
+        first, second = self.accounts[0]['id'], self.accounts[1]['id']
+        business = {"Name": "Blue Door Bistro", "Website": "https://bluedoor.example.com",
+                    "Phone": "217-555-0142", "Address": "12 Main Street, Springfield"}
+        results = self.bulk.write_businesses([
+            (first, business),
+            ('5725767000009999999', business),
+            (second, dict(business, Name="Lakeside Hardware")),
+        ])
+
+        self.assertEqual([result["key"] for result in results], [first, '5725767000009999999', second])
+        self.assertEqual([result["status"] for result in results], ['success', 'error', 'success'])
+        self.assertEqual(results[0]["id"], first)
+        self.assertEqual(results[1]["errors"], 'RECORD_NOT_FOUND')
+        self.assertEqual(self.client.synced_images, [first, second])
+
+        names = {row['Id']: row['Account_Name'] for row in self.bulk.iter_read('Accounts', fields=['Id', 'Account_Name'])}
+        self.assertEqual(names[first], "Blue Door Bistro")
+        self.assertEqual(names[second], "Lakeside Hardware")
+
+
+if __name__ == '__main__':
+    unittest.main()